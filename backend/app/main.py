@@ -1,11 +1,17 @@
 import os
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from typing import List, Optional
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from typing import List, Optional, AsyncGenerator, Union, Dict, Any
+import time
 import uuid
 import datetime
 import json
+import re
 from .models.schemas import (
     ChatMessage, 
     ChatRequest, 
@@ -14,16 +20,94 @@ from .models.schemas import (
     DocumentCreate,
     Document,
     KnowledgeBaseCreate,
-    KnowledgeBase
+    KnowledgeBase,
+    SessionInfo,
+    PrefetchRequest,
+    PrefetchResponse
 )
 from .services.deepseek import DeepseekClient
-from .services.chroma_manager import DocumentProcessor
+from .services.session_store import SessionStore, Session
+from .services.sse import SSEDeltaParser
+from .services.prefetch import PrefetchCache
+from .services.metrics import REGISTRY, TraceMiddleware, stage, record_stage, TIME_TO_FIRST_TOKEN
+
+# 注意：chroma_manager 会在首次使用时才导入，避免启动时加载chromadb/numpy等重型依赖
+
+logger = logging.getLogger(__name__)
+
+# 服务实例（按需创建，见 get_deepseek_client / get_document_processor）
+_deepseek_client: Optional[DeepseekClient] = None
+_document_processor = None
+# 两个服务各用一把锁：打开向量库可能耗时接近一秒，期间不能挡住事件循环上创建客户端
+_client_lock = threading.Lock()
+_processor_lock = threading.Lock()
+_warmup_task: Optional[asyncio.Task] = None
+_warmup_error: Optional[str] = None
+
+def get_deepseek_client() -> DeepseekClient:
+    """获取Deepseek客户端，首次调用时创建（缺少API密钥时在这里报错，而不是导入时）"""
+    global _deepseek_client
+    if _deepseek_client is None:
+        with _client_lock:
+            if _deepseek_client is None:
+                _deepseek_client = DeepseekClient()
+    return _deepseek_client
+
+def get_document_processor():
+    """获取文档处理器，首次调用时导入chromadb并打开向量库"""
+    global _document_processor
+    if _document_processor is None:
+        with _processor_lock:
+            if _document_processor is None:
+                from .services.chroma_manager import DocumentProcessor
+                _document_processor = DocumentProcessor(
+                    persist_directory=os.getenv("RAG_PERSIST_DIRECTORY", "./chroma_db"),
+                    vector_storage=os.getenv("RAG_VECTOR_STORAGE", "float32"),
+                    shards=int(os.getenv("RAG_SHARDS", "1"))
+                )
+    return _document_processor
+
+async def get_document_processor_async():
+    """异步获取文档处理器：未初始化时在线程中创建，避免阻塞事件循环"""
+    if _document_processor is not None:
+        return _document_processor
+    return await asyncio.to_thread(get_document_processor)
+
+async def _warmup_services():
+    """后台预热：在线程中创建文档处理器，不阻塞事件循环和启动过程"""
+    global _warmup_error
+    try:
+        await asyncio.to_thread(get_document_processor)
+        _warmup_error = None
+        logger.info("文档处理器预热完成")
+    except Exception as e:
+        _warmup_error = str(e)
+        logger.error(f"文档处理器预热失败: {str(e)}")
+
+def _schedule_warmup():
+    """没有进行中的预热任务时调度一次（启动时调用；未就绪时由 /ready 调用，失败后可重试）"""
+    global _warmup_task
+    if _warmup_task is None or _warmup_task.done():
+        _warmup_task = asyncio.create_task(_warmup_services())
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时只调度后台预热，立即开始接受请求"""
+    if os.getenv("RAG_WARMUP", "1") != "0":
+        _schedule_warmup()
+    yield
+    if _warmup_task is not None and not _warmup_task.done():
+        _warmup_task.cancel()
+    if _deepseek_client is not None:
+        await _deepseek_client.aclose()
+    session_store.flush()
 
 # 创建FastAPI应用
 app = FastAPI(
     title="Deepseek RAG API",
     description="基于Deepseek的RAG问答系统API",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # 配置CORS
@@ -33,46 +117,136 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Session-Id"],
 )
 
-# 初始化服务
-deepseek_client = DeepseekClient()
-document_processor = DocumentProcessor()
+# 请求带 X-Debug-Trace 头时，通过 Server-Timing 响应头返回各阶段耗时
+app.add_middleware(TraceMiddleware)
 
 # 模拟数据存储
 knowledge_bases = {}
 documents = {}
 
+# 服务端会话：内存LRU，设置 RAG_SESSION_SPILL_PATH 后淘汰的会话写入SQLite
+session_store = SessionStore(
+    max_sessions=int(os.getenv("RAG_SESSION_MAX", "1000")),
+    spill_path=os.getenv("RAG_SESSION_SPILL_PATH"),
+    token_threshold=int(os.getenv("RAG_SESSION_TOKEN_THRESHOLD", "3000"))
+)
+
+# 正在处理一轮对话的会话ID；同一会话的并发请求会读到相同的历史并交错写入，直接拒绝
+_busy_sessions = set()
+
+# 检索预取缓存，见 /api/search/prefetch
+prefetch_cache = PrefetchCache(ttl=float(os.getenv("RAG_PREFETCH_TTL", "30")))
+
+# 检索期间在后台预热上游连接，默认关闭；流量稀疏、空闲连接常被回收时设置 RAG_UPSTREAM_WARMUP=1 开启
+UPSTREAM_WARMUP = os.getenv("RAG_UPSTREAM_WARMUP", "0") != "0"
+
+# 后台预热任务的强引用，事件循环只持有任务的弱引用
+_upstream_warmups = set()
+
+def _upstream_warmup_done(task: asyncio.Task):
+    _upstream_warmups.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.debug(f"预热上游连接失败: {task.exception()}")
+
+def _start_upstream_warmup():
+    """在后台预热上游连接，不等待其完成：聊天请求不会因为预热而变慢"""
+    if not UPSTREAM_WARMUP:
+        return
+    try:
+        client = get_deepseek_client()
+    except Exception as e:
+        # 例如缺少API密钥：预热失败不影响检索
+        logger.debug(f"预热上游连接失败: {str(e)}")
+        return
+    task = asyncio.ensure_future(client.warmup())
+    _upstream_warmups.add(task)
+    task.add_done_callback(_upstream_warmup_done)
+
+def _get_session(session_id: Optional[str]) -> Optional[Session]:
+    """按ID获取会话，不存在时返回404"""
+    if not session_id:
+        return None
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="会话不存在")
+    return session
+
+def _claim_session(session_id: Optional[str]) -> Optional[Session]:
+    """获取会话并标记为处理中，上一轮尚未结束时返回409；调用方负责 _release_session"""
+    session = _get_session(session_id)
+    if session is None:
+        return None
+    if session.id in _busy_sessions:
+        raise HTTPException(status_code=409, detail="会话正在处理上一轮对话")
+    _busy_sessions.add(session.id)
+    return session
+
+def _release_session(session: Optional[Session]):
+    if session is not None:
+        _busy_sessions.discard(session.id)
+
 # API路由
 @app.get("/")
 async def root():
     return {"message": "欢迎使用Deepseek RAG API"}
 
+@app.get("/health")
+async def health():
+    """存活检查：进程能响应即可，不依赖任何下游服务"""
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def ready():
+    """就绪检查：文档处理器已初始化且配置了Deepseek API密钥时才算就绪
+
+    未初始化时（RAG_WARMUP=0 或上次预热失败）在后台启动初始化，探针重试即可变为就绪。
+    """
+    if _document_processor is None:
+        _schedule_warmup()
+    checks = {
+        "document_processor": _document_processor is not None,
+        "deepseek_api_key": bool(os.getenv("DEEPSEEK_API_KEY")),
+    }
+    body = {"status": "ready" if all(checks.values()) else "not_ready", "checks": checks}
+    if _warmup_error and _document_processor is None:
+        body["error"] = _warmup_error
+    return JSONResponse(status_code=200 if body["status"] == "ready" else 503, content=body)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus格式的指标"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """非流式聊天接口"""
+    session = _claim_session(request.session_id)
     try:
+        # 有会话时，服务端历史 + 本轮新消息构成完整对话
+        conversation = session.prompt_messages() + request.messages if session else request.messages
+        
         # 如果指定了知识库，则进行RAG处理
         sources = []
         if request.knowledge_base_id and request.knowledge_base_id in knowledge_bases:
             # 获取最后一条用户消息
             last_user_message = next((m for m in reversed(request.messages) if m.role == "user"), None)
             if last_user_message:
-                # 执行语义搜索
-                search_results = await document_processor.semantic_search(
-                    query=last_user_message.content,
-                    knowledge_base_id=request.knowledge_base_id
-                )
+                # 执行语义搜索（优先使用预取结果，同时预热上游连接）
+                search_results = await _retrieve("chat", request, last_user_message.content)
                 
                 # 构建上下文
-                context = "以下是与问题相关的信息：\n\n"
-                for result in search_results:
-                    context += f"---\n{result['content']}\n---\n\n"
-                context += "请基于以上信息回答问题，如果信息不足，请说明无法回答。\n\n"
+                with stage("chat", "context"):
+                    context = "以下是与问题相关的信息：\n\n"
+                    for result in search_results:
+                        context += f"---\n{result['content']}\n---\n\n"
+                    context += "请基于以上信息回答问题，如果信息不足，请说明无法回答。\n\n"
                 
                 # 添加系统消息
                 system_message = ChatMessage(role="system", content=context)
-                augmented_messages = [system_message] + request.messages
+                augmented_messages = [system_message] + conversation
                 
                 # 保存来源信息
                 sources = [
@@ -86,58 +260,163 @@ async def chat(request: ChatRequest):
                 ]
                 
                 # 调用API，传递选定的模型
-                response = await deepseek_client.chat_completion(augmented_messages, model=request.model)
+                with stage("chat", "upstream"):
+                    response = await get_deepseek_client().chat_completion(augmented_messages, model=request.model)
             else:
-                response = await deepseek_client.chat_completion(request.messages, model=request.model)
+                with stage("chat", "upstream"):
+                    response = await get_deepseek_client().chat_completion(conversation, model=request.model)
         else:
-            response = await deepseek_client.chat_completion(request.messages, model=request.model)
+            with stage("chat", "upstream"):
+                response = await get_deepseek_client().chat_completion(conversation, model=request.model)
         
         # 提取回复内容
         message = response["choices"][0]["message"]["content"]
         
-        return ChatResponse(message=message, sources=sources)
+        # 回复成功后再把本轮写入会话
+        if session:
+            session_store.append(session, request.messages + [ChatMessage(role="assistant", content=message)])
+        
+        return ChatResponse(message=message, sources=sources, session_id=session.id if session else None)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        _release_session(session)
+
+async def _search(knowledge_base_id: str, query: str) -> List[Dict[str, Any]]:
+    document_processor = await get_document_processor_async()
+    return await document_processor.semantic_search(query=query, knowledge_base_id=knowledge_base_id)
+
+async def _retrieve(pipeline: str, request: ChatRequest, query: str) -> List[Dict[str, Any]]:
+    """检索上下文：有可用的预取结果时直接取用，否则现场检索
+
+    检索期间在后台预热上游连接；检索结束时预热未完成也不等待，预热在后台继续。
+    """
+    _start_upstream_warmup()
+    with stage(pipeline, "retrieval"):
+        search_results = await prefetch_cache.get(request.knowledge_base_id, query, request.prefetch_id)
+        if search_results is None:
+            search_results = await _search(request.knowledge_base_id, query)
+    return search_results
+
+async def _timed_stream(stream: AsyncGenerator[Union[str, bytes], None], pipeline: str,
+                        request_start: float) -> AsyncGenerator[Union[str, bytes], None]:
+    """包装上游流，记录上游首token耗时、端到端首token耗时（TTFT）和总耗时"""
+    start = time.perf_counter()
+    first = True
+    async for chunk in stream:
+        if first:
+            now = time.perf_counter()
+            record_stage(pipeline, "upstream_first_token", now - start)
+            TIME_TO_FIRST_TOKEN.observe(now - request_start, pipeline=pipeline)
+            first = False
+        yield chunk
+    record_stage(pipeline, "upstream_total", time.perf_counter() - start)
+
+async def _session_stream(stream: AsyncGenerator[Union[str, bytes], None], session: Session,
+                          new_messages: List[ChatMessage], raw: bool) -> AsyncGenerator[Union[str, bytes], None]:
+    """转发流的同时收集回复，流正常结束后把本轮写入会话；无论成败，结束时释放会话"""
+    try:
+        parser = SSEDeltaParser() if raw else None
+        reply = []
+        async for chunk in stream:
+            if parser is not None:
+                reply.extend(parser.feed(chunk))
+            else:
+                reply.append(chunk)
+            yield chunk
+        session_store.append(session, new_messages + [ChatMessage(role="assistant", content="".join(reply))])
+    finally:
+        _release_session(session)
 
 @app.post("/api/chat/stream")
 async def chat_stream(request: ChatRequest):
     """流式聊天接口"""
+    request_start = time.perf_counter()
+    session = _claim_session(request.session_id)
     try:
+        # 有会话时，服务端历史 + 本轮新消息构成完整对话
+        conversation = session.prompt_messages() + request.messages if session else request.messages
+        
+        # sse格式直接透传上游字节，省去逐token的解析和重新编码
+        client = get_deepseek_client()
+        open_stream = client.chat_stream_raw if request.stream_format == "sse" else client.chat_stream
+        
         # 如果指定了知识库，则进行RAG处理
         if request.knowledge_base_id and request.knowledge_base_id in knowledge_bases:
             # 获取最后一条用户消息
             last_user_message = next((m for m in reversed(request.messages) if m.role == "user"), None)
             if last_user_message:
-                # 执行语义搜索
-                search_results = await document_processor.semantic_search(
-                    query=last_user_message.content,
-                    knowledge_base_id=request.knowledge_base_id
-                )
+                # 执行语义搜索（优先使用预取结果，同时预热上游连接）
+                search_results = await _retrieve("chat_stream", request, last_user_message.content)
                 
                 # 构建上下文
-                context = "以下是与问题相关的信息：\n\n"
-                for result in search_results:
-                    context += f"---\n{result['content']}\n---\n\n"
-                context += "请基于以上信息回答问题，如果信息不足，请说明无法回答。\n\n"
+                with stage("chat_stream", "context"):
+                    context = "以下是与问题相关的信息：\n\n"
+                    for result in search_results:
+                        context += f"---\n{result['content']}\n---\n\n"
+                    context += "请基于以上信息回答问题，如果信息不足，请说明无法回答。\n\n"
                 
                 # 添加系统消息
                 system_message = ChatMessage(role="system", content=context)
-                augmented_messages = [system_message] + request.messages
+                augmented_messages = [system_message] + conversation
                 
                 # 调用流式API，传递选定的模型
-                stream = deepseek_client.chat_stream(augmented_messages, model=request.model)
+                stream = open_stream(augmented_messages, model=request.model)
             else:
-                stream = deepseek_client.chat_stream(request.messages, model=request.model)
+                stream = open_stream(conversation, model=request.model)
         else:
-            stream = deepseek_client.chat_stream(request.messages, model=request.model)
+            stream = open_stream(conversation, model=request.model)
         
         # 返回流式响应
-        return StreamingResponse(stream, media_type="text/event-stream")
+        headers = {}
+        if session:
+            stream = _session_stream(stream, session, request.messages, raw=request.stream_format == "sse")
+            headers["X-Session-Id"] = session.id
+        return StreamingResponse(_timed_stream(stream, "chat_stream", request_start), media_type="text/event-stream", headers=headers)
     
     except Exception as e:
+        # 流尚未交给 _session_stream，在这里释放会话
+        _release_session(session)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/search/prefetch", response_model=PrefetchResponse)
+async def prefetch_search(request: PrefetchRequest):
+    """预取检索：立即返回，检索和上游连接预热在后台进行
+
+    客户端可在用户输入时用草稿问题调用，随后的聊天请求带上 prefetch_id 即可直接使用结果；
+    不带 prefetch_id 时，问题与预取查询完全相同也会命中。
+    """
+    if request.knowledge_base_id not in knowledge_bases:
+        raise HTTPException(status_code=404, detail="知识库不存在")
+    
+    _start_upstream_warmup()
+    prefetch_id = prefetch_cache.start(
+        request.knowledge_base_id, request.query,
+        lambda: _search(request.knowledge_base_id, request.query)
+    )
+    return PrefetchResponse(prefetch_id=prefetch_id, expires_in=prefetch_cache.ttl)
+
+@app.post("/api/sessions", response_model=SessionInfo)
+async def create_session():
+    """创建会话，之后的聊天请求带上 session_id 即可只发送新消息"""
+    session = session_store.create()
+    return SessionInfo(id=session.id, updated_at=datetime.datetime.fromtimestamp(session.updated_at).isoformat())
+
+@app.get("/api/sessions/{session_id}", response_model=SessionInfo)
+async def get_session(session_id: str):
+    """查看会话的摘要和最近消息"""
+    session = _get_session(session_id)
+    return SessionInfo(id=session.id, summary=session.summary, messages=session.messages,
+                       updated_at=datetime.datetime.fromtimestamp(session.updated_at).isoformat())
+
+@app.delete("/api/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """删除会话"""
+    if not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail="会话不存在")
+    return {"status": "deleted"}
+
 @app.post("/api/knowledge-bases", response_model=KnowledgeBase)
 async def create_knowledge_base(kb: KnowledgeBaseCreate):
     """创建知识库"""
@@ -161,6 +440,86 @@ async def list_knowledge_bases():
     """列出所有知识库"""
     return list(knowledge_bases.values())
 
+@app.get("/api/knowledge-bases/{kb_id}/export")
+async def export_knowledge_base(kb_id: str):
+    """导出知识库快照（文本块、元数据、嵌入向量及知识库/文档记录），以二进制流返回"""
+    if kb_id not in knowledge_bases:
+        raise HTTPException(status_code=404, detail="知识库不存在")
+    
+    # 快照模块依赖numpy，推迟到使用时再导入，保持 app.main 的导入开销
+    from .services.snapshot import write_snapshot
+    
+    document_processor = await get_document_processor_async()
+    count = await asyncio.to_thread(document_processor.count_chunks, kb_id)
+    dim = await asyncio.to_thread(document_processor.vector_dimension, kb_id)
+    header = {
+        "knowledge_base": knowledge_bases[kb_id].model_dump(),
+        "documents": [doc.model_dump() for doc in documents.values() if doc.knowledge_base_id == kb_id],
+        "count": count,
+        "dim": dim,
+    }
+    # 同步生成器由Starlette放到线程池中迭代，按批读取向量库，不会一次性把整个知识库载入内存
+    return StreamingResponse(
+        write_snapshot(header, document_processor.export_batches(kb_id)),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{kb_id}.ragsnap"'}
+    )
+
+# 正在导入的知识库ID；导入在工作线程中执行，用线程锁保护
+_importing = set()
+_importing_lock = threading.Lock()
+
+# 知识库ID同时用作集合名（分片时追加后缀），规则与Chroma集合名一致
+_KB_ID_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]{1,400}[A-Za-z0-9]")
+
+def _import_snapshot(document_processor, f) -> KnowledgeBase:
+    """读取快照并直接写入向量库，返回恢复的知识库"""
+    from .services.snapshot import read_snapshot
+    header, batches = read_snapshot(f)
+    # 头部校验失败统一抛出ValueError（由接口返回400），此时尚未写入任何数据
+    kb_data = header.get("knowledge_base")
+    if not isinstance(kb_data, dict) or not isinstance(kb_data.get("id"), str):
+        raise ValueError("快照缺少知识库信息")
+    if not _KB_ID_PATTERN.fullmatch(kb_data["id"]):
+        raise ValueError(f"快照中的知识库ID无效: {kb_data['id']}")
+    kb = KnowledgeBase(**kb_data)
+    docs = header.get("documents", [])
+    if not isinstance(docs, list) or not all(isinstance(doc, dict) for doc in docs):
+        raise ValueError("快照中的文档记录无效")
+    docs = [Document(**doc) for doc in docs]
+    
+    with _importing_lock:
+        if kb.id in _importing:
+            raise HTTPException(status_code=409, detail="该知识库正在导入")
+        if kb.id in knowledge_bases or document_processor.has_chunks(kb.id):
+            raise HTTPException(status_code=409, detail="知识库已存在")
+        _importing.add(kb.id)
+    
+    try:
+        with stage("import", "total"):
+            document_processor.import_batches(kb.id, batches)
+        knowledge_bases[kb.id] = kb
+        for doc in docs:
+            documents[doc.id] = doc
+    finally:
+        with _importing_lock:
+            _importing.discard(kb.id)
+    return kb
+
+@app.post("/api/knowledge-bases/import", response_model=KnowledgeBase)
+async def import_knowledge_base(file: UploadFile = File(...)):
+    """从快照导入知识库，直接写入已有的嵌入向量，不重新解析和嵌入文档"""
+    document_processor = await get_document_processor_async()
+    try:
+        return await asyncio.to_thread(_import_snapshot, document_processor, file.file)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"导入知识库快照失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"导入知识库快照失败: {str(e)}")
+
 @app.post("/api/documents", response_model=Document)
 async def upload_document(
     file: UploadFile = File(...),
@@ -186,6 +545,7 @@ async def upload_document(
         id=doc_id,
         name=file.filename,
         description=description,
+        knowledge_base_id=knowledge_base_id,
         status="processing",
         created_at=timestamp,
         updated_at=timestamp
@@ -195,6 +555,7 @@ async def upload_document(
     
     # 处理文档（实际项目中应该使用Celery异步处理）
     try:
+        document_processor = await get_document_processor_async()
         result = await document_processor.process_file(
             file_path=file_path,
             knowledge_base_id=knowledge_base_id
@@ -212,7 +573,7 @@ async def upload_document(
     except Exception as e:
         new_doc.status = "failed"
         new_doc.updated_at = datetime.datetime.now().isoformat()
-        print(f"处理文档失败: {str(e)}")
+        logger.error(f"处理文档失败: {str(e)}")
     
     return new_doc
 
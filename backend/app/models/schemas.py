@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
 
 class ChatMessage(BaseModel):
     role: str
@@ -9,6 +9,12 @@ class ChatRequest(BaseModel):
     messages: List[ChatMessage]
     knowledge_base_id: Optional[str] = None
     model: str = "deepseek-chat"  # 默认使用deepseek-chat
+    # 流式输出格式：text 为纯文本片段；sse 为透传上游的SSE字节（客户端需自行解析data:行）
+    stream_format: Literal["text", "sse"] = "text"
+    # 服务端会话ID：指定后 messages 只需包含本轮新增的消息，历史由服务端保存
+    session_id: Optional[str] = None
+    # 预取ID：使用 /api/search/prefetch 提前开始的检索结果，省去聊天请求中的检索等待
+    prefetch_id: Optional[str] = None
 
 class Source(BaseModel):
     document_id: str
@@ -19,6 +25,21 @@ class Source(BaseModel):
 class ChatResponse(BaseModel):
     message: str
     sources: List[Source] = []
+    session_id: Optional[str] = None
+
+class SessionInfo(BaseModel):
+    id: str
+    summary: str = ""
+    messages: List[ChatMessage] = []
+    updated_at: str
+
+class PrefetchRequest(BaseModel):
+    knowledge_base_id: str
+    query: str
+
+class PrefetchResponse(BaseModel):
+    prefetch_id: str
+    expires_in: float
 
 class DocumentBase(BaseModel):
     name: str
@@ -30,6 +51,7 @@ class DocumentCreate(DocumentBase):
 
 class Document(DocumentBase):
     id: str
+    knowledge_base_id: Optional[str] = None
     status: str = "pending"
     chunk_count: int = 0
     created_at: str
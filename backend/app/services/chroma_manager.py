@@ -1,13 +1,16 @@
 import os
 import uuid
 import time
-import chromadb
-from chromadb.config import Settings
 import re
-from typing import List, Dict, Any, Tuple, Optional
+import asyncio
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple, Optional, Iterable, Iterator
 import numpy as np
 import logging
 import hashlib
+from .metrics import stage, record_stage, CHUNKS_INGESTED, CACHE_HITS, CACHE_MISSES
 
 logger = logging.getLogger(__name__)
 
@@ -99,16 +102,40 @@ class Document:
         self.page_content = page_content
         self.metadata = metadata or {}
 
+# 快照导出/导入时每批的行数（低于Chroma单次写入的上限）
+SNAPSHOT_BATCH_SIZE = 5000
+
+# 向量存储格式：float32 为Chroma原生存储；float16/int8 使用量化集合（见 quantized_store.py）
+VECTOR_STORAGE_TYPES = ("float32", "float16", "int8")
+
 class DocumentProcessor:
-    def __init__(self, persist_directory: str = "./chroma_db"):
+    def __init__(self, persist_directory: str = "./chroma_db", vector_storage: str = "float32",
+                 shards: int = 1):
+        if vector_storage not in VECTOR_STORAGE_TYPES:
+            raise ValueError(f"不支持的向量存储格式: {vector_storage}")
+        if shards < 1:
+            raise ValueError(f"分片数必须为正整数: {shards}")
         self.persist_directory = persist_directory
+        self.vector_storage = vector_storage
+        # 每个知识库拆分为 shards 个集合，文档按ID哈希分配到分片；
+        # 修改分片数后已有知识库需通过快照导出/导入重新分布
+        self.shards = shards
         os.makedirs(persist_directory, exist_ok=True)
         
+        # chromadb导入很重（连带numpy、onnxruntime等），推迟到实例化时再导入
+        import chromadb
+        from chromadb.config import Settings
+        
         self.client = chromadb.PersistentClient(
             path=persist_directory,
             settings=Settings(anonymized_telemetry=False)
         )
         
+        # 集合句柄缓存，避免每次检索都查询一次SQLite元数据
+        # 首次打开量化集合要读取全部编码，可能在多个工作线程中同时发生，创建过程加锁
+        self._collections = {}
+        self._collections_lock = threading.Lock()
+        
         # 文本分割器
         self.text_splitter = CustomTextSplitter(
             chunk_size=500,
@@ -173,10 +200,68 @@ class DocumentProcessor:
     
     def _get_or_create_collection(self, collection_name: str):
         """获取或创建一个集合"""
-        try:
-            return self.client.get_collection(name=collection_name)
-        except:
-            return self.client.create_collection(name=collection_name)
+        collection = self._collections.get(collection_name)
+        if collection is not None:
+            CACHE_HITS.inc(cache="collection")
+            return collection
+        
+        CACHE_MISSES.inc(cache="collection")
+        with self._collections_lock:
+            collection = self._collections.get(collection_name)
+            if collection is not None:
+                return collection
+            if self.vector_storage != "float32":
+                from .quantized_store import QuantizedCollection
+                collection = QuantizedCollection(
+                    os.path.join(self.persist_directory, "quantized"),
+                    collection_name,
+                    dtype=self.vector_storage
+                )
+            else:
+                try:
+                    collection = self.client.get_collection(name=collection_name)
+                except:
+                    collection = self.client.create_collection(name=collection_name)
+            self._collections[collection_name] = collection
+        return collection
+    
+    def _shard_names(self, knowledge_base_id: str) -> List[str]:
+        """知识库的全部分片集合名；单分片时沿用知识库ID本身，兼容已有数据"""
+        if self.shards == 1:
+            return [knowledge_base_id]
+        return [f"{knowledge_base_id}-shard-{i}" for i in range(self.shards)]
+    
+    def _shard_index(self, document_id: str) -> int:
+        """按文档ID的MD5分配分片（不用内置hash，保证跨进程稳定）"""
+        digest = hashlib.md5(document_id.encode()).digest()
+        return int.from_bytes(digest[:4], "little") % self.shards
+    
+    def _shard_collections(self, knowledge_base_id: str) -> list:
+        return [self._get_or_create_collection(name) for name in self._shard_names(knowledge_base_id)]
+    
+    def drop_collections(self, knowledge_base_id: str):
+        """删除知识库的全部分片集合及其磁盘数据，并清除句柄缓存"""
+        with self._collections_lock:
+            for name in self._shard_names(knowledge_base_id):
+                collection = self._collections.pop(name, None)
+                if self.vector_storage != "float32":
+                    if collection is not None:
+                        collection.close()
+                    shutil.rmtree(os.path.join(self.persist_directory, "quantized", name), ignore_errors=True)
+                else:
+                    try:
+                        self.client.delete_collection(name)
+                    except Exception:
+                        # 集合不存在
+                        pass
+    
+    def _add_to_collection(self, collection_name: str, **kwargs):
+        """在工作线程中打开集合并写入（打开量化集合可能需要读取磁盘上的全部编码）"""
+        self._get_or_create_collection(collection_name).add(**kwargs)
+    
+    def _query_collection(self, collection_name: str, **kwargs) -> Dict[str, Any]:
+        """在工作线程中打开集合并查询"""
+        return self._get_or_create_collection(collection_name).query(**kwargs)
     
     def _simple_text_to_vector(self, text: str) -> List[float]:
         """简单文本向量化：使用MD5哈希并规范化数值
@@ -221,16 +306,16 @@ class DocumentProcessor:
             start_time = time.time()
             
             # 1. 加载文档
-            documents = self._get_loader_for_file(file_path)
+            with stage("process_file", "load"):
+                documents = self._get_loader_for_file(file_path)
             
             # 2. 分割文档
-            chunks = self.text_splitter.split_documents(documents)
-            
-            # 3. 获取集合
-            collection = self._get_or_create_collection(knowledge_base_id)
+            with stage("process_file", "split"):
+                chunks = self.text_splitter.split_documents(documents)
             
-            # 4. 处理每个文本块
+            # 3. 处理每个文本块，整篇文档写入同一个分片
             document_id = str(uuid.uuid4())
+            shard_name = self._shard_names(knowledge_base_id)[self._shard_index(document_id)]
             file_name = os.path.basename(file_path)
             
             ids = []
@@ -255,17 +340,25 @@ class DocumentProcessor:
                 
                 metadatas.append(metadata)
             
-            # 5. 生成嵌入并添加到数据库
-            embeddings = self._generate_embeddings(texts)
+            # 4. 生成嵌入并添加到数据库
+            with stage("process_file", "embed"):
+                embeddings = self._generate_embeddings(texts)
             
-            collection.add(
-                ids=ids,
-                embeddings=embeddings,
-                documents=texts,
-                metadatas=metadatas
-            )
+            # 写入放到线程中执行：并发上传的文档落在不同分片上时可以并行写入，
+            # 写入期间事件循环也能继续处理检索请求
+            with stage("process_file", "store"):
+                await asyncio.to_thread(
+                    self._add_to_collection,
+                    shard_name,
+                    ids=ids,
+                    embeddings=embeddings,
+                    documents=texts,
+                    metadatas=metadatas
+                )
+            CHUNKS_INGESTED.inc(len(chunks))
             
             process_time = time.time() - start_time
+            record_stage("process_file", "total", process_time)
             
             return {
                 "document_id": document_id,
@@ -284,29 +377,35 @@ class DocumentProcessor:
                              top_k: int = 3) -> List[Dict[str, Any]]:
         """语义搜索"""
         try:
-            # 1. 获取集合
-            collection = self._get_or_create_collection(knowledge_base_id)
+            # 1. 分片集合名（集合在工作线程中打开，首次加载不阻塞事件循环）
+            shard_names = self._shard_names(knowledge_base_id)
             
             # 2. 生成查询嵌入
-            query_embedding = self._simple_text_to_vector(query)
+            with stage("semantic_search", "embed"):
+                query_embedding = self._simple_text_to_vector(query)
             
-            # 3. 执行搜索
-            results = collection.query(
+            # 3. 执行搜索：在线程中查询，不阻塞事件循环（同时进行的上游预热等I/O可以继续）；
+            #    多分片时并发查询每个分片，各取top_k后按距离合并
+            query_kwargs = dict(
                 query_embeddings=[query_embedding],
                 n_results=top_k,
                 include=["documents", "metadatas", "distances"]
             )
+            with stage("semantic_search", "query"):
+                shard_results = await asyncio.gather(*(
+                    asyncio.to_thread(self._query_collection, name, **query_kwargs) for name in shard_names
+                ))
+            
+            hits = []
+            for results in shard_results:
+                if results['documents']:
+                    hits.extend(zip(results['documents'][0], results['metadatas'][0], results['distances'][0]))
+            if len(shard_results) > 1:
+                hits = sorted(hits, key=lambda hit: hit[2])[:top_k]
             
             # 4. 格式化结果
             formatted_results = []
-            if not results['documents']:
-                return formatted_results
-                
-            for i, (doc, metadata, distance) in enumerate(zip(
-                results['documents'][0],
-                results['metadatas'][0],
-                results['distances'][0]
-            )):
+            for doc, metadata, distance in hits:
                 formatted_results.append({
                     "content": doc,
                     "document_id": metadata.get("document_id", ""),
@@ -319,4 +418,106 @@ class DocumentProcessor:
             
         except Exception as e:
             logger.error(f"语义搜索失败: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
+    
+    def vector_dimension(self, knowledge_base_id: str) -> int:
+        """知识库中向量的维度，空知识库返回0"""
+        for collection in self._shard_collections(knowledge_base_id):
+            if collection.count():
+                result = collection.get(include=["embeddings"], limit=1)
+                return len(result["embeddings"][0])
+        return 0
+    
+    def has_chunks(self, knowledge_base_id: str) -> bool:
+        """知识库是否已有数据；与 count_chunks 不同，不会为不存在的分片创建集合"""
+        for name in self._shard_names(knowledge_base_id):
+            collection = self._collections.get(name)
+            if collection is None:
+                if self.vector_storage != "float32":
+                    if not os.path.isdir(os.path.join(self.persist_directory, "quantized", name)):
+                        continue
+                else:
+                    try:
+                        self.client.get_collection(name=name)
+                    except Exception:
+                        # 集合不存在
+                        continue
+                collection = self._get_or_create_collection(name)
+            if collection.count():
+                return True
+        return False
+    
+    def count_chunks(self, knowledge_base_id: str) -> int:
+        """知识库中的文本块数量（所有分片之和）"""
+        return sum(collection.count() for collection in self._shard_collections(knowledge_base_id))
+    
+    def export_batches(self, knowledge_base_id: str,
+                       batch_size: int = SNAPSHOT_BATCH_SIZE) -> Iterator[Tuple[List[str], List[str], List[Dict[str, Any]], np.ndarray]]:
+        """按批次读出知识库的全部文本块、元数据和嵌入，用于快照导出"""
+        for collection in self._shard_collections(knowledge_base_id):
+            yield from self._export_collection(collection, batch_size)
+    
+    @staticmethod
+    def _export_collection(collection, batch_size: int):
+        total = collection.count()
+        for offset in range(0, total, batch_size):
+            result = collection.get(
+                include=["embeddings", "documents", "metadatas"],
+                limit=batch_size,
+                offset=offset
+            )
+            yield (
+                list(result["ids"]),
+                list(result["documents"]),
+                list(result["metadatas"]),
+                np.asarray(result["embeddings"], dtype=np.float32)
+            )
+    
+    def import_batches(self, knowledge_base_id: str,
+                       batches: Iterable[Tuple[List[str], List[str], List[Dict[str, Any]], np.ndarray]]) -> int:
+        """把快照批次直接写入向量库（不重新解析文件、不重新生成嵌入），返回导入的文本块数
+        
+        按每个文本块元数据中的 document_id 重新分配分片，因此也可用于修改分片数；
+        同一批次内各分片的写入并行执行。
+        """
+        collections = self._shard_collections(knowledge_base_id)
+        if any(collection.count() for collection in collections):
+            raise ValueError(f"知识库 {knowledge_base_id} 已有数据，不能导入快照")
+        
+        total = 0
+        try:
+            with ThreadPoolExecutor(max_workers=len(collections)) as pool:
+                for ids, texts, metadatas, embeddings in batches:
+                    if len(collections) == 1:
+                        groups = {0: list(range(len(ids)))}
+                    else:
+                        groups = {}
+                        for row, metadata in enumerate(metadatas):
+                            document_id = (metadata or {}).get("document_id") or ids[row]
+                            groups.setdefault(self._shard_index(document_id), []).append(row)
+                    
+                    with stage("import", "store"):
+                        futures = [
+                            pool.submit(self._import_rows, collections[shard], rows, ids, texts, metadatas, embeddings)
+                            for shard, rows in groups.items()
+                        ]
+                        for future in futures:
+                            future.result()
+                    total += len(ids)
+                    CHUNKS_INGESTED.inc(len(ids))
+        except BaseException:
+            # 快照损坏或写入失败时删除已写入的部分，避免留下无主的文本块、阻塞重新导入
+            self.drop_collections(knowledge_base_id)
+            raise
+        return total
+    
+    @staticmethod
+    def _import_rows(collection, rows: List[int], ids, texts, metadatas, embeddings: np.ndarray):
+        for start in range(0, len(rows), SNAPSHOT_BATCH_SIZE):
+            part = rows[start:start + SNAPSHOT_BATCH_SIZE]
+            collection.add(
+                ids=[ids[i] for i in part],
+                embeddings=embeddings[part].tolist(),
+                documents=[texts[i] for i in part],
+                metadatas=[metadatas[i] for i in part]
+            )
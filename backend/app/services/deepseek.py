@@ -1,12 +1,27 @@
 import httpx
 import json
 import os
-from typing import List, AsyncGenerator, Dict, Any
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import List, AsyncGenerator, Dict, Any, Optional
 from ..models.schemas import ChatMessage
+from .metrics import UPSTREAM_ERRORS
+from .sse import SSEDeltaParser
+
+logger = logging.getLogger(__name__)
+
+def _iter_chunks(response: httpx.Response):
+    """上游未压缩时直接读取原始字节，跳过httpx的解码和分块层"""
+    if response.headers.get("content-encoding", "identity") == "identity":
+        return response.aiter_raw()
+    return response.aiter_bytes()
 
 class DeepseekClient:
-    def __init__(self, api_key: str = None):
-        self.base_url = "https://api.deepseek.com/v1"
+    def __init__(self, api_key: str = None, base_url: str = None, keepalive_expiry: float = None):
+        # 可通过 DEEPSEEK_BASE_URL 指向兼容的网关或本地模拟服务（见 benchmarks/mock_upstream.py）
+        self.base_url = base_url or os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com/v1")
         self.api_key = api_key or os.getenv("DEEPSEEK_API_KEY")
         if not self.api_key:
             raise ValueError("Deepseek API密钥未提供")
@@ -15,46 +30,106 @@ class DeepseekClient:
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        self._client: Optional[httpx.AsyncClient] = None
+        # 空闲连接的保活时间；超过该时间没有请求时，连接池中的连接已被关闭，需要预热
+        self.keepalive_expiry = keepalive_expiry if keepalive_expiry is not None else float(
+            os.getenv("DEEPSEEK_KEEPALIVE_EXPIRY", "5.0")
+        )
+        self._last_used = 0.0
+        # 进行中的流式请求数；有流在进行时连接显然是热的，不需要预热
+        self._active_streams = 0
+        self._warming: Optional[asyncio.Future] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """共享的连接池客户端：复用TCP/TLS连接，避免每次请求重新加载证书和握手"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=30.0,
+                limits=httpx.Limits(
+                    max_connections=100,
+                    max_keepalive_connections=100,
+                    keepalive_expiry=self.keepalive_expiry
+                )
+            )
+        return self._client
+
+    async def warmup(self):
+        """预热上游连接：最近没有请求时，用轻量的 GET /models 提前完成TCP/TLS握手
+
+        与检索并行执行，随后的聊天请求复用这条已建立的连接。失败时只记录日志。
+        同时发起的多次预热共用一个请求。
+        """
+        if self._active_streams or time.monotonic() - self._last_used < self.keepalive_expiry:
+            return
+        if self._warming is None:
+            self._warming = asyncio.ensure_future(self._warmup())
+            self._warming.add_done_callback(self._warmup_done)
+        await asyncio.shield(self._warming)
+
+    def _warmup_done(self, future: asyncio.Future):
+        self._warming = None
+
+    async def _warmup(self):
+        try:
+            await self.client.get(f"{self.base_url}/models", headers=self.headers, timeout=5.0)
+            self._last_used = time.monotonic()
+        except httpx.HTTPError as e:
+            logger.debug(f"预热上游连接失败: {str(e)}")
+
+    async def aclose(self):
+        """关闭连接池（应用关闭时调用）"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
     async def chat_completion(self, messages: List[ChatMessage], model: str = "deepseek-chat") -> Dict[str, Any]:
         """非流式聊天完成"""
-        async with httpx.AsyncClient() as client:
-            data = {
-                "model": model,
-                "messages": [{"role": m.role, "content": m.content} for m in messages],
-                "temperature": 0.7,
-                "stream": False
-            }
-            
+        client = self.client
+        data = {
+            "model": model,
+            "messages": [{"role": m.role, "content": m.content} for m in messages],
+            "temperature": 0.7,
+            "stream": False
+        }
+        
+        try:
             response = await client.post(
                 f"{self.base_url}/chat/completions",
                 json=data,
                 headers=self.headers,
                 timeout=30.0
             )
-            
-            if response.status_code != 200:
-                error_detail = response.text
-                try:
-                    error_json = response.json()
-                    if "error" in error_json:
-                        error_detail = error_json["error"].get("message", error_detail)
-                except:
-                    pass
-                raise Exception(f"Deepseek API错误 ({response.status_code}): {error_detail}")
-            
-            return response.json()
+        except httpx.HTTPError:
+            UPSTREAM_ERRORS.inc(endpoint="chat_completion")
+            raise
+        self._last_used = time.monotonic()
+        
+        if response.status_code != 200:
+            UPSTREAM_ERRORS.inc(endpoint="chat_completion")
+            error_detail = response.text
+            try:
+                error_json = response.json()
+                if "error" in error_json:
+                    error_detail = error_json["error"].get("message", error_detail)
+            except:
+                pass
+            raise Exception(f"Deepseek API错误 ({response.status_code}): {error_detail}")
+        
+        return response.json()
 
-    async def chat_stream(self, messages: List[ChatMessage], model: str = "deepseek-chat") -> AsyncGenerator[str, None]:
-        """流式聊天完成"""
-        async with httpx.AsyncClient() as client:
-            data = {
-                "model": model,
-                "messages": [{"role": m.role, "content": m.content} for m in messages],
-                "temperature": 0.7,
-                "stream": True
-            }
-            
+    @asynccontextmanager
+    async def _open_stream(self, messages: List[ChatMessage], model: str):
+        """打开上游流式请求，状态码非200时抛出异常"""
+        client = self.client
+        data = {
+            "model": model,
+            "messages": [{"role": m.role, "content": m.content} for m in messages],
+            "temperature": 0.7,
+            "stream": True
+        }
+        
+        try:
             async with client.stream(
                 "POST",
                 f"{self.base_url}/chat/completions",
@@ -63,6 +138,7 @@ class DeepseekClient:
                 timeout=30.0
             ) as response:
                 if response.status_code != 200:
+                    UPSTREAM_ERRORS.inc(endpoint="chat_stream")
                     error_detail = await response.aread()
                     try:
                         error_json = json.loads(error_detail)
@@ -72,21 +148,35 @@ class DeepseekClient:
                         pass
                     raise Exception(f"Deepseek API错误 ({response.status_code}): {error_detail}")
                 
-                async for line in response.aiter_lines():
-                    if not line.strip():
-                        continue
-                    
-                    if line.startswith("data: "):
-                        json_data = line[6:].strip()
-                        
-                        if json_data == "[DONE]":
-                            break
-                        
-                        try:
-                            data = json.loads(json_data)
-                            delta = data.get("choices", [{}])[0].get("delta", {})
-                            if "content" in delta and delta["content"]:
-                                yield delta["content"]
-                        except json.JSONDecodeError:
-                            print(f"无法解析流式响应: {json_data}")
-                            continue 
\ No newline at end of file
+                # 长时间的流只在结束时更新 _last_used 的话，期间的其他请求会误判连接已冷
+                self._last_used = time.monotonic()
+                self._active_streams += 1
+                try:
+                    yield response
+                finally:
+                    self._active_streams -= 1
+        except httpx.HTTPError:
+            UPSTREAM_ERRORS.inc(endpoint="chat_stream")
+            raise
+        finally:
+            self._last_used = time.monotonic()
+
+    async def chat_stream(self, messages: List[ChatMessage], model: str = "deepseek-chat") -> AsyncGenerator[str, None]:
+        """流式聊天完成
+
+        直接解析原始字节块，同一网络块内的多个token合并为一次输出，减少逐token的开销。
+        """
+        async with self._open_stream(messages, model) as response:
+            parser = SSEDeltaParser()
+            async for chunk in _iter_chunks(response):
+                contents = parser.feed(chunk)
+                if contents:
+                    yield "".join(contents)
+                if parser.done:
+                    break
+
+    async def chat_stream_raw(self, messages: List[ChatMessage], model: str = "deepseek-chat") -> AsyncGenerator[bytes, None]:
+        """流式聊天完成（透传模式）：原样转发上游SSE字节，不做解析和重新编码"""
+        async with self._open_stream(messages, model) as response:
+            async for chunk in _iter_chunks(response):
+                yield chunk
@@ -0,0 +1,197 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+# Prometheus文本格式的轻量指标实现，避免引入prometheus_client依赖
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    """格式化标签，如 {pipeline="chat",stage="retrieval"}"""
+    parts = [f'{k}="{v}"' for k, v in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Counter:
+    """单调递增计数器"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(k, "")) for k in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels.get(k, "")) for k in self.labelnames)
+        return self._values.get(key, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram:
+    """累积分桶直方图"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # 每个标签组合：[各桶计数..., +Inf计数, 总和]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(k, "")) for k in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels) -> int:
+        key = tuple(str(labels.get(k, "")) for k in self.labelnames)
+        series = self._values.get(key)
+        return int(sum(series[:-1])) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                cumulative = 0.0
+                for bound, bucket_count in zip(self.buckets, series):
+                    cumulative += bucket_count
+                    le = _format_labels(self.labelnames, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{le} {int(cumulative)}")
+                cumulative += series[len(self.buckets)]
+                le = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{le} {int(cumulative)}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_count{labels} {int(cumulative)}")
+                lines.append(f"{self.name}_sum{labels} {series[-1]}")
+        return lines
+
+class MetricsRegistry:
+    """指标注册表，负责汇总输出"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "rag_stage_duration_seconds",
+    "RAG流水线各阶段耗时",
+    ("pipeline", "stage")
+)
+CHUNKS_INGESTED = REGISTRY.counter(
+    "rag_chunks_ingested_total",
+    "写入向量库的文本块数量"
+)
+CACHE_HITS = REGISTRY.counter(
+    "rag_cache_hits_total",
+    "缓存命中次数",
+    ("cache",)
+)
+CACHE_MISSES = REGISTRY.counter(
+    "rag_cache_misses_total",
+    "缓存未命中次数",
+    ("cache",)
+)
+TIME_TO_FIRST_TOKEN = REGISTRY.histogram(
+    "rag_time_to_first_token_seconds",
+    "从收到聊天请求到向客户端发出第一个token的端到端耗时",
+    ("pipeline",)
+)
+UPSTREAM_ERRORS = REGISTRY.counter(
+    "rag_upstream_errors_total",
+    "Deepseek上游调用失败次数",
+    ("endpoint",)
+)
+
+# 当前请求的追踪span列表；仅在请求携带调试头时启用
+_current_trace: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("rag_trace", default=None)
+
+def record_stage(pipeline: str, name: str, seconds: float):
+    """记录一个阶段耗时到直方图，并在追踪开启时追加span"""
+    STAGE_SECONDS.observe(seconds, pipeline=pipeline, stage=name)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.append((f"{pipeline}.{name}", seconds))
+
+@contextmanager
+def stage(pipeline: str, name: str):
+    """计时上下文：with stage("chat", "retrieval"): ..."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(pipeline, name, time.perf_counter() - start)
+
+def format_server_timing(spans: List[Tuple[str, float]]) -> str:
+    """将span格式化为Server-Timing头（单位毫秒）"""
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in spans)
+
+class TraceMiddleware:
+    """ASGI中间件：请求带 X-Debug-Trace 头时，在响应的 Server-Timing 头中返回各阶段span
+
+    流式响应在响应头发出后才产生的span（如首token耗时）不会出现在头中，只记录到指标。
+    """
+
+    header = b"x-debug-trace"
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not any(k == self.header for k, _ in scope["headers"]):
+            await self.app(scope, receive, send)
+            return
+
+        spans: List[Tuple[str, float]] = []
+        token = _current_trace.set(spans)
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start" and spans:
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", format_server_timing(spans).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            _current_trace.reset(token)
@@ -0,0 +1,85 @@
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from .metrics import CACHE_HITS, CACHE_MISSES
+
+logger = logging.getLogger(__name__)
+
+class _Entry:
+    __slots__ = ("knowledge_base_id", "query", "task", "expires_at")
+
+    def __init__(self, knowledge_base_id: str, query: str, task: asyncio.Task, expires_at: float):
+        self.knowledge_base_id = knowledge_base_id
+        self.query = query
+        self.task = task
+        self.expires_at = expires_at
+
+def _log_failure(task: asyncio.Task):
+    """取走后台任务的异常，避免 "exception was never retrieved" 警告"""
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"检索预取失败: {task.exception()}")
+
+class PrefetchCache:
+    """检索预取缓存
+
+    客户端在用户输入时调用预取接口，检索在后台任务中立即开始；随后的聊天请求通过
+    prefetch_id（或相同的知识库+查询）取用结果。任务仍在运行时聊天请求直接等待它，
+    不会重复检索。条目在 ttl 秒后过期。
+    """
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._by_query: Dict[Tuple[str, str], str] = {}
+
+    def _evict(self):
+        """条目按创建时间排列，从头部清理过期和超出容量的条目"""
+        now = time.monotonic()
+        while self._entries:
+            prefetch_id, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+            key = (entry.knowledge_base_id, entry.query)
+            if self._by_query.get(key) == prefetch_id:
+                del self._by_query[key]
+
+    def start(self, knowledge_base_id: str, query: str,
+              search: Callable[[], Awaitable[List[Dict[str, Any]]]]) -> str:
+        """启动后台检索，返回 prefetch_id"""
+        prefetch_id = str(uuid.uuid4())
+        task = asyncio.ensure_future(search())
+        task.add_done_callback(_log_failure)
+        self._entries[prefetch_id] = _Entry(knowledge_base_id, query, task, time.monotonic() + self.ttl)
+        self._by_query[(knowledge_base_id, query)] = prefetch_id
+        self._evict()
+        return prefetch_id
+
+    async def get(self, knowledge_base_id: str, query: str,
+                  prefetch_id: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        """取预取结果；没有可用结果（未命中、已过期、知识库不符或检索失败）时返回None"""
+        self._evict()
+        if prefetch_id is None:
+            prefetch_id = self._by_query.get((knowledge_base_id, query))
+        entry = self._entries.get(prefetch_id) if prefetch_id else None
+        if entry is None or entry.knowledge_base_id != knowledge_base_id:
+            CACHE_MISSES.inc(cache="prefetch")
+            return None
+
+        try:
+            # shield：聊天请求被取消时不影响共享的预取任务
+            results = await asyncio.shield(entry.task)
+        except asyncio.CancelledError:
+            if not entry.task.cancelled():
+                raise
+            CACHE_MISSES.inc(cache="prefetch")
+            return None
+        except Exception:
+            CACHE_MISSES.inc(cache="prefetch")
+            return None
+        CACHE_HITS.inc(cache="prefetch")
+        return results
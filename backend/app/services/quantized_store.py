@@ -0,0 +1,252 @@
+import os
+import json
+import sqlite3
+import threading
+from typing import List, Dict, Any, Optional
+import numpy as np
+
+# 计算近似距离时，每块反量化出的临时float32矩阵的字节上限
+BLOCK_BYTES = 8 << 20
+
+def _block_rows(dim: int) -> int:
+    """按字节预算换算每块的行数（1536维约1365行）"""
+    return max(1, BLOCK_BYTES // (dim * 4))
+
+class QuantizedCollection:
+    """量化向量集合，实现DocumentProcessor用到的Chroma集合接口子集（add/query/get/count）
+
+    内存中只保留紧凑编码：float16，或int8加逐向量缩放系数（x ≈ code * scale）。
+    全精度float32向量追加写入磁盘文件并以memmap方式打开，只在重排序时读取候选行。
+    文本和元数据保存在同目录下的SQLite中。距离为平方L2，与Chroma默认的l2空间一致。
+    """
+
+    def __init__(self, directory: str, name: str, dtype: str = "int8", rescore_factor: int = 4):
+        if dtype not in ("int8", "float16"):
+            raise ValueError(f"不支持的量化类型: {dtype}")
+        if os.path.basename(name) != name or name in ("", ".", ".."):
+            raise ValueError(f"非法的集合名称: {name}")
+
+        self.name = name
+        self.dtype = dtype
+        self.rescore_factor = rescore_factor
+        self.directory = os.path.join(directory, name)
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._codes_path = os.path.join(self.directory, f"codes.{dtype}")
+        self._scales_path = os.path.join(self.directory, "scales.f32")
+        self._vectors_path = os.path.join(self.directory, "vectors.f32")
+        self._lock = threading.Lock()
+
+        self._db = sqlite3.connect(os.path.join(self.directory, "records.sqlite3"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            "row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, document TEXT, metadata TEXT)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+
+        dim = self._db.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+        self.dim: Optional[int] = int(dim[0]) if dim else None
+        self._load()
+
+    def _load(self):
+        """从磁盘加载编码；以SQLite中的记录数为准，截掉未提交的尾部数据"""
+        self._count = self._db.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+        self._vectors = None
+        # 编码按块保存：每块为 (codes, scales, norms)，追加时不复制已有数据
+        self._blocks = []
+        # 上次崩溃可能在文件末尾留下未提交的行，之后的追加必须紧接在已提交的数据之后
+        if self.dim is not None:
+            self._truncate_files(self._count, self.dim)
+        if not self._count:
+            return
+
+        code_dtype = np.int8 if self.dtype == "int8" else np.float16
+        codes = np.fromfile(self._codes_path, dtype=code_dtype)[:self._count * self.dim].reshape(self._count, self.dim)
+        scales = np.fromfile(self._scales_path, dtype=np.float32)[:self._count] if self.dtype == "int8" else None
+        self._blocks.append((codes, scales, self._approx_norms(codes, scales)))
+
+    @staticmethod
+    def _approx_norms(codes: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+        """计算反量化向量的平方范数"""
+        norms = np.empty(len(codes), dtype=np.float32)
+        rows = _block_rows(codes.shape[1])
+        for start in range(0, len(codes), rows):
+            block = codes[start:start + rows].astype(np.float32)
+            norms[start:start + rows] = np.einsum("ij,ij->i", block, block)
+        if scales is not None:
+            norms *= scales * scales
+        return norms
+
+    def _truncate_files(self, rows: int, dim: int):
+        """把向量文件截断到 rows 行，撤销写了一半的追加"""
+        code_size = 1 if self.dtype == "int8" else 2
+        for path, row_bytes in ((self._codes_path, dim * code_size), (self._scales_path, 4), (self._vectors_path, dim * 4)):
+            if os.path.exists(path) and os.path.getsize(path) > rows * row_bytes:
+                os.truncate(path, rows * row_bytes)
+
+    def _quantize(self, vectors: np.ndarray):
+        if self.dtype == "float16":
+            return vectors.astype(np.float16), None
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def count(self) -> int:
+        return self._count
+
+    def add(self, ids: List[str], embeddings: List[List[float]],
+            documents: Optional[List[str]] = None, metadatas: Optional[List[Dict[str, Any]]] = None):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("embeddings 与 ids 数量不一致")
+        if not len(ids):
+            return
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+
+        with self._lock:
+            if self.dim is not None and vectors.shape[1] != self.dim:
+                raise ValueError(f"向量维度不匹配: 期望 {self.dim}，实际 {vectors.shape[1]}")
+
+            codes, scales = self._quantize(vectors)
+            start = self._count
+            try:
+                if self.dim is None:
+                    self._db.execute("INSERT INTO meta (key, value) VALUES ('dim', ?)", (str(vectors.shape[1]),))
+                self._db.executemany(
+                    "INSERT INTO records (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                    [
+                        (start + i, id_, doc, json.dumps(meta, ensure_ascii=False) if meta is not None else None)
+                        for i, (id_, doc, meta) in enumerate(zip(ids, documents, metadatas))
+                    ]
+                )
+                # 先追加向量文件再提交记录，崩溃时 _load 会按记录数截断多余数据
+                with open(self._codes_path, "ab") as f:
+                    f.write(codes.tobytes())
+                if scales is not None:
+                    with open(self._scales_path, "ab") as f:
+                        f.write(scales.tobytes())
+                with open(self._vectors_path, "ab") as f:
+                    f.write(vectors.tobytes())
+                self._db.commit()
+            except Exception:
+                self._db.rollback()
+                self._truncate_files(start, vectors.shape[1])
+                raise
+            self.dim = vectors.shape[1]
+
+            blocks = self._blocks + [(codes, scales, self._approx_norms(codes, scales))]
+            # 末尾块不小于前一块的一半时合并，块数保持在对数级别，合并的总复制量为 O(N log N)
+            while len(blocks) > 1 and len(blocks[-1][0]) * 2 >= len(blocks[-2][0]):
+                (c1, s1, n1), (c2, s2, n2) = blocks[-2], blocks[-1]
+                merged = (
+                    np.concatenate([c1, c2]),
+                    np.concatenate([s1, s2]) if s1 is not None else None,
+                    np.concatenate([n1, n2]),
+                )
+                blocks = blocks[:-2] + [merged]
+            self._blocks = blocks
+            self._count = start + len(ids)
+            self._vectors = None
+
+    def _full_vectors(self) -> np.ndarray:
+        """全精度向量的只读memmap（按需由操作系统分页读取）"""
+        if self._vectors is None:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(self._count, self.dim))
+        return self._vectors
+
+    @staticmethod
+    def _approx_distances(query: np.ndarray, blocks) -> np.ndarray:
+        """在编码上计算近似平方L2距离：|x|² - 2x·q + |q|²"""
+        parts = []
+        rows = _block_rows(len(query))
+        for codes, scales, norms in blocks:
+            dots = np.empty(len(codes), dtype=np.float32)
+            for start in range(0, len(codes), rows):
+                dots[start:start + rows] = codes[start:start + rows].astype(np.float32) @ query
+            if scales is not None:
+                dots *= scales
+            parts.append(norms - 2.0 * dots)
+        return (parts[0] if len(parts) == 1 else np.concatenate(parts)) + float(query @ query)
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 10,
+              include: List[str] = ("documents", "metadatas", "distances")) -> Dict[str, Any]:
+        """近似检索 + 全精度重排序：先在编码上取 n_results * rescore_factor 个候选，再用float32向量精确排序"""
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        result = {"ids": []}
+        for key in include:
+            result[key] = []
+
+        with self._lock:
+            blocks, count = self._blocks, self._count
+            vectors = self._full_vectors() if count else None
+
+        for query in queries:
+            if not count:
+                rows, distances = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            else:
+                approx = self._approx_distances(query, blocks)
+                k = min(count, max(n_results, n_results * self.rescore_factor))
+                candidates = np.argpartition(approx, k - 1)[:k] if k < count else np.arange(count)
+                candidates.sort()
+                diff = vectors[candidates] - query
+                exact = np.einsum("ij,ij->i", diff, diff)
+                order = np.argsort(exact)[:n_results]
+                rows, distances = candidates[order], exact[order]
+
+            records = self._fetch(rows.tolist())
+            result["ids"].append([r[0] for r in records])
+            if "documents" in include:
+                result["documents"].append([r[1] for r in records])
+            if "metadatas" in include:
+                result["metadatas"].append([json.loads(r[2]) if r[2] else None for r in records])
+            if "distances" in include:
+                result["distances"].append(distances.tolist())
+            if "embeddings" in include:
+                result["embeddings"].append(np.asarray(vectors[rows]).tolist() if len(rows) else [])
+        return result
+
+    def get(self, include: List[str] = ("documents", "metadatas"), limit: Optional[int] = None,
+            offset: int = 0) -> Dict[str, Any]:
+        """按插入顺序分页读取记录（用于快照导出），embeddings 返回全精度向量"""
+        with self._lock:
+            count = self._count
+            vectors = self._full_vectors() if count else None
+            end = count if limit is None else min(count, offset + limit)
+            records = self._db.execute(
+                "SELECT id, document, metadata FROM records WHERE row >= ? AND row < ? ORDER BY row", (offset, end)
+            ).fetchall()
+        result = {"ids": [r[0] for r in records]}
+        if "documents" in include:
+            result["documents"] = [r[1] for r in records]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(r[2]) if r[2] else None for r in records]
+        if "embeddings" in include:
+            result["embeddings"] = np.asarray(vectors[offset:end]) if records else np.empty((0, self.dim or 0), dtype=np.float32)
+        return result
+
+    def _fetch(self, rows: List[int]):
+        """按行号取记录，保持输入顺序"""
+        if not rows:
+            return []
+        placeholders = ",".join("?" * len(rows))
+        with self._lock:
+            fetched = self._db.execute(
+                f"SELECT row, id, document, metadata FROM records WHERE row IN ({placeholders})", rows
+            ).fetchall()
+        by_row = {r[0]: r[1:] for r in fetched}
+        return [by_row[row] for row in rows]
+
+    def close(self):
+        """关闭SQLite连接；之后不能再使用该集合"""
+        with self._lock:
+            self._db.close()
+            self._blocks = []
+            self._vectors = None
+            self._count = 0
+
+    def memory_bytes(self) -> int:
+        """常驻内存中的向量相关字节数（编码、缩放系数和范数）"""
+        return sum(a.nbytes for block in self._blocks for a in block if a is not None)
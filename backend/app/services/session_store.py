@@ -0,0 +1,165 @@
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Callable
+from ..models.schemas import ChatMessage
+from .metrics import CACHE_HITS, CACHE_MISSES
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数：中日韩字符按1个token计，其余字符按4个字符1个token计"""
+    cjk = sum(1 for ch in text if "\u2e80" <= ch <= "\u9fff" or "\uac00" <= ch <= "\ud7af")
+    return cjk + (len(text) - cjk + 3) // 4
+
+def extractive_summary(summary: str, messages: List[ChatMessage], max_chars: int = 2000,
+                       per_message_chars: int = 200) -> str:
+    """抽取式滚动摘要：把被压缩的消息截断后追加到摘要末尾，超长时丢弃最早的内容
+
+    不调用上游模型，压缩过程不增加请求延迟；可通过 SessionStore(summarizer=...) 替换。
+    """
+    lines = [summary] if summary else []
+    for m in messages:
+        content = m.content if len(m.content) <= per_message_chars else m.content[:per_message_chars] + "…"
+        lines.append(f"{m.role}: {content}")
+    text = "\n".join(lines)
+    return text[-max_chars:] if len(text) > max_chars else text
+
+class Session:
+    """一个会话：滚动摘要 + 最近的若干轮原始消息"""
+
+    def __init__(self, session_id: str, messages: Optional[List[ChatMessage]] = None,
+                 summary: str = "", updated_at: Optional[float] = None):
+        self.id = session_id
+        self.messages: List[ChatMessage] = messages or []
+        self.summary = summary
+        self.updated_at = updated_at or time.time()
+
+    def prompt_messages(self) -> List[ChatMessage]:
+        """发送给上游的历史：摘要（作为系统消息）+ 最近的原始消息"""
+        if not self.summary:
+            return list(self.messages)
+        return [ChatMessage(role="system", content=f"以下是之前对话的摘要：\n{self.summary}")] + self.messages
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "messages": [m.model_dump() for m in self.messages],
+            "summary": self.summary,
+            "updated_at": self.updated_at,
+        }, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, session_id: str, data: str) -> "Session":
+        payload = json.loads(data)
+        return cls(
+            session_id,
+            messages=[ChatMessage(**m) for m in payload["messages"]],
+            summary=payload.get("summary", ""),
+            updated_at=payload.get("updated_at"),
+        )
+
+class SessionStore:
+    """服务端会话存储：内存LRU，可选溢出到SQLite
+
+    客户端每轮只发送新消息；历史超过 token_threshold 时，除最近 keep_recent 条以外的消息
+    被压缩进滚动摘要，上游提示的长度因此不随对话轮数线性增长。
+    """
+
+    def __init__(self, max_sessions: int = 1000, spill_path: Optional[str] = None,
+                 token_threshold: int = 3000, keep_recent: int = 6,
+                 summarizer: Callable[[str, List[ChatMessage]], str] = extractive_summary):
+        self.max_sessions = max_sessions
+        self.spill_path = spill_path
+        self.token_threshold = token_threshold
+        self.keep_recent = keep_recent
+        self.summarizer = summarizer
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    def _spill_db(self) -> Optional[sqlite3.Connection]:
+        if self.spill_path and self._db is None:
+            self._db = sqlite3.connect(self.spill_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL)"
+            )
+            self._db.commit()
+        return self._db
+
+    def _put(self, session: Session):
+        """放入LRU，超出容量时把最久未用的会话写入SQLite（未配置时直接丢弃）"""
+        self._sessions[session.id] = session
+        self._sessions.move_to_end(session.id)
+        while len(self._sessions) > self.max_sessions:
+            _, evicted = self._sessions.popitem(last=False)
+            self._spill([evicted])
+
+    def _spill(self, sessions: List[Session]):
+        db = self._spill_db()
+        if db is None or not sessions:
+            return
+        db.executemany(
+            "INSERT OR REPLACE INTO sessions (id, data, updated_at) VALUES (?, ?, ?)",
+            [(s.id, s.to_json(), s.updated_at) for s in sessions]
+        )
+        db.commit()
+
+    def create(self) -> Session:
+        session = Session(str(uuid.uuid4()))
+        with self._lock:
+            self._put(session)
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                CACHE_HITS.inc(cache="session")
+                self._sessions.move_to_end(session_id)
+                return session
+
+            CACHE_MISSES.inc(cache="session")
+            db = self._spill_db()
+            if db is None:
+                return None
+            row = db.execute("SELECT data FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None
+            session = Session.from_json(session_id, row[0])
+            self._put(session)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            found = self._sessions.pop(session_id, None) is not None
+            db = self._spill_db()
+            if db is not None:
+                found = db.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount > 0 or found
+                db.commit()
+            return found
+
+    def append(self, session: Session, messages: List[ChatMessage]):
+        """追加一轮对话，必要时压缩历史
+
+        这一轮进行期间会话可能已被LRU淘汰（溢出的副本不含本轮），所以追加后重新放回LRU。
+        """
+        with self._lock:
+            session.messages.extend(messages)
+            session.updated_at = time.time()
+            self.compact(session)
+            self._put(session)
+
+    def compact(self, session: Session):
+        """历史超过阈值时，把较早的消息压缩进滚动摘要"""
+        tokens = estimate_tokens(session.summary) + sum(estimate_tokens(m.content) for m in session.messages)
+        if tokens <= self.token_threshold or len(session.messages) <= self.keep_recent:
+            return
+        cut = len(session.messages) - self.keep_recent
+        old, session.messages = session.messages[:cut], session.messages[cut:]
+        session.summary = self.summarizer(session.summary, old)
+
+    def flush(self):
+        """把内存中的全部会话写入SQLite（应用关闭时调用）"""
+        with self._lock:
+            self._spill(list(self._sessions.values()))
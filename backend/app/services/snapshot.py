@@ -0,0 +1,63 @@
+import json
+import struct
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Tuple
+import numpy as np
+
+# 知识库快照格式（小端序）：
+#   MAGIC (8字节)
+#   头部：uint32 长度 + JSON {version, knowledge_base, documents, count, dim}
+#   若干批次：uint32 行数 n + uint32 JSON长度 + JSON {ids, documents, metadatas} + n*dim 个连续float32
+#   结束标记：行数为0的批次
+# 向量以连续的float32块写出，导入时直接构造数组，不需要重新解析文件或重新生成嵌入。
+
+MAGIC = b"RAGSNAP1"
+VERSION = 1
+_U32 = struct.Struct("<I")
+_BATCH = struct.Struct("<II")
+
+Batch = Tuple[List[str], List[str], List[Dict[str, Any]], np.ndarray]
+
+def write_snapshot(header: Dict[str, Any], batches: Iterable[Batch]) -> Iterator[bytes]:
+    """按批次生成快照字节流，可直接作为流式响应体"""
+    head = json.dumps({"version": VERSION, **header}, ensure_ascii=False).encode("utf-8")
+    yield MAGIC + _U32.pack(len(head)) + head
+
+    for ids, documents, metadatas, embeddings in batches:
+        if not ids:
+            continue
+        meta = json.dumps({"ids": ids, "documents": documents, "metadatas": metadatas},
+                          ensure_ascii=False).encode("utf-8")
+        vectors = np.ascontiguousarray(embeddings, dtype="<f4")
+        yield _BATCH.pack(len(ids), len(meta)) + meta
+        yield vectors.tobytes()
+
+    yield _BATCH.pack(0, 0)
+
+def _read_exact(f: BinaryIO, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("快照文件不完整")
+    return data
+
+def read_snapshot(f: BinaryIO) -> Tuple[Dict[str, Any], Iterator[Batch]]:
+    """读取快照头部，返回 (header, 批次迭代器)；批次按需从文件中读取"""
+    if _read_exact(f, len(MAGIC)) != MAGIC:
+        raise ValueError("不是有效的知识库快照文件")
+    (head_size,) = _U32.unpack(_read_exact(f, _U32.size))
+    header = json.loads(_read_exact(f, head_size))
+    if not isinstance(header, dict):
+        raise ValueError("快照头部格式错误")
+    if header.get("version") != VERSION:
+        raise ValueError(f"不支持的快照版本: {header.get('version')}")
+
+    def batches() -> Iterator[Batch]:
+        dim = header.get("dim") or 0
+        while True:
+            rows, meta_size = _BATCH.unpack(_read_exact(f, _BATCH.size))
+            if rows == 0:
+                return
+            meta = json.loads(_read_exact(f, meta_size))
+            vectors = np.frombuffer(_read_exact(f, rows * dim * 4), dtype="<f4").reshape(rows, dim)
+            yield meta["ids"], meta["documents"], meta["metadatas"], vectors
+
+    return header, batches()
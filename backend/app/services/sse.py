@@ -0,0 +1,49 @@
+import json
+import logging
+from typing import List
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # orjson为可选依赖，未安装时退回标准库
+    _loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+class SSEDeltaParser:
+    """增量解析上游SSE字节流，提取 choices[0].delta.content
+
+    直接处理原始字节块：按换行切分，只对 data: 行做JSON解析，不完整的行留到下一块。
+    每次 feed 返回该块内解析出的全部内容片段，调用方可以合并后一次性输出。
+    """
+
+    __slots__ = ("_buffer", "done")
+
+    def __init__(self):
+        self._buffer = b""
+        self.done = False
+
+    def feed(self, chunk: bytes) -> List[str]:
+        if self._buffer:
+            chunk = self._buffer + chunk
+        lines = chunk.split(b"\n")
+        self._buffer = lines.pop()
+
+        contents = []
+        for line in lines:
+            if not line.startswith(b"data:"):
+                continue
+            payload = line[5:].strip()
+            if not payload:
+                continue
+            if payload == b"[DONE]":
+                self.done = True
+                break
+            try:
+                content = _loads(payload)["choices"][0]["delta"].get("content")
+            except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+                logger.warning(f"无法解析流式响应: {payload[:200]!r}")
+                continue
+            if content:
+                contents.append(content)
+        return contents
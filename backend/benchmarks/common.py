@@ -0,0 +1,123 @@
+import os
+import sys
+import json
+import time
+import socket
+import subprocess
+import statistics
+from typing import List, Dict, Any, Optional
+
+# backend 目录，基准测试子进程以它为工作目录启动
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port() -> int:
+    """获取一个空闲的本地端口"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def percentile(samples: List[float], pct: float) -> float:
+    """计算百分位数（线性插值）"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = (len(ordered) - 1) * pct / 100.0
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    """汇总一组耗时样本（秒）"""
+    return {
+        "count": len(samples),
+        "mean": statistics.fmean(samples) if samples else 0.0,
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+        "max": max(samples) if samples else 0.0,
+    }
+
+def dump(result: Dict[str, Any], output: str = None):
+    """输出JSON结果到文件或标准输出"""
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text + "\n")
+
+def peak_rss_mb(pid: Optional[int] = None) -> float:
+    """进程的峰值常驻内存（MB），默认为当前进程
+
+    Linux 上读取 /proc/<pid>/status 的 VmHWM，可用 reset_peak_rss 清零后按场景统计；
+    其他类Unix系统只支持当前进程（getrusage，不可清零）。
+    """
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if pid is not None and pid != os.getpid():
+        raise RuntimeError("当前系统不支持读取其他进程的峰值内存")
+    import resource
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位为KB，macOS 上为字节
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+def reset_peak_rss(pid: Optional[int] = None) -> bool:
+    """把进程的峰值常驻内存重置为当前值（Linux的 clear_refs），不支持时返回False"""
+    try:
+        with open(f"/proc/{pid or 'self'}/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+class ServerProcess:
+    """在子进程中运行服务（python -m ...），与发压的基准进程隔离，不共享GIL和内存统计
+
+    args 为 python -m 之后的参数；进程就绪以 GET ready_path 返回200为准。
+    """
+
+    def __init__(self, args: List[str], port: int = None, env: Dict[str, str] = None,
+                 cwd: str = BACKEND_DIR, ready_path: str = "/health"):
+        self.port = port or free_port()
+        self.args = [a.format(port=self.port) for a in args]
+        self.env = {**os.environ, **(env or {})}
+        # 子进程工作目录可能不是backend，确保能导入 app 和 benchmarks 包
+        self.env["PYTHONPATH"] = os.pathsep.join(filter(None, [BACKEND_DIR, self.env.get("PYTHONPATH")]))
+        self.cwd = cwd
+        self.ready_path = ready_path
+        self.proc: Optional[subprocess.Popen] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def pid(self) -> int:
+        return self.proc.pid
+
+    def __enter__(self):
+        import httpx
+        self.proc = subprocess.Popen([sys.executable, "-m"] + self.args, cwd=self.cwd, env=self.env)
+        deadline = time.time() + 60
+        while time.time() < deadline and self.proc.poll() is None:
+            try:
+                if httpx.get(self.base_url + self.ready_path, timeout=0.5).status_code == 200:
+                    return self
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.05)
+        self.__exit__()
+        raise RuntimeError(f"基准服务启动失败: {' '.join(self.args)}")
+
+    def __exit__(self, *exc):
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
@@ -0,0 +1,67 @@
+"""合成中英文语料，用于可复现的基准测试"""
+import os
+import random
+from typing import List
+
+ZH_TERMS = [
+    "知识库", "向量检索", "语义搜索", "文档解析", "大语言模型", "上下文窗口", "嵌入向量",
+    "召回率", "相似度", "分块策略", "流式输出", "问答系统", "数据治理", "权限管理",
+    "性能优化", "缓存命中", "并发请求", "延迟分布", "吞吐量", "持久化存储",
+]
+ZH_FILLERS = ["是", "的", "可以", "需要", "通过", "提升", "影响", "包括", "用于", "依赖"]
+ZH_PUNCT = ["，", "。", "；", "！", "？"]
+
+EN_WORDS = [
+    "retrieval", "embedding", "vector", "index", "query", "latency", "throughput",
+    "document", "chunk", "context", "model", "stream", "token", "cache", "shard",
+    "the", "a", "of", "and", "with", "for", "improves", "depends", "on", "is",
+]
+
+def _zh_sentence(rng: random.Random) -> str:
+    parts = []
+    for _ in range(rng.randint(3, 8)):
+        parts.append(rng.choice(ZH_TERMS))
+        parts.append(rng.choice(ZH_FILLERS))
+    return "".join(parts) + rng.choice(ZH_PUNCT)
+
+def _en_sentence(rng: random.Random) -> str:
+    words = [rng.choice(EN_WORDS) for _ in range(rng.randint(6, 16))]
+    return " ".join(words).capitalize() + ". "
+
+def generate_document(rng: random.Random, chars: int, language: str) -> str:
+    """生成约 chars 个字符的文档，按段落组织；language 为 zh、en 或 mixed"""
+    paragraphs = []
+    total = 0
+    while total < chars:
+        lang = language if language != "mixed" else rng.choice(["zh", "en"])
+        make = _zh_sentence if lang == "zh" else _en_sentence
+        paragraph = "".join(make(rng) for _ in range(rng.randint(2, 6)))
+        paragraphs.append(paragraph)
+        total += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+def generate_corpus(directory: str, documents: int, chars: int,
+                    language: str = "mixed", seed: int = 42) -> List[str]:
+    """在 directory 下生成 documents 个 .txt 文件，返回文件路径列表"""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(documents):
+        lang = language if language != "mixed" else ("zh" if i % 2 == 0 else "en")
+        path = os.path.join(directory, f"doc_{i:05d}_{lang}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(generate_document(rng, chars, lang))
+        paths.append(path)
+    return paths
+
+def sample_queries(paths: List[str], count: int, seed: int = 7) -> List[str]:
+    """从语料中抽取句子作为查询"""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        with open(rng.choice(paths), encoding="utf-8") as f:
+            paragraphs = [p for p in f.read().split("\n\n") if p.strip()]
+        paragraph = rng.choice(paragraphs)
+        start = rng.randint(0, max(0, len(paragraph) - 40))
+        queries.append(paragraph[start:start + 40])
+    return queries
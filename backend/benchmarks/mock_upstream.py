@@ -0,0 +1,117 @@
+"""本地模拟的Deepseek接口（OpenAI兼容的 /chat/completions），支持SSE流式输出
+
+可单独运行：python -m benchmarks.mock_upstream --port 9000
+然后设置 DEEPSEEK_BASE_URL=http://127.0.0.1:9000 启动后端。
+"""
+import json
+import time
+import asyncio
+import argparse
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse, JSONResponse
+
+TOKENS = ["检索", "增强", "生成", " answer", " based", " on", " the", " context", "。", "\n"]
+
+def create_app(tokens: int = 64, first_token_delay: float = 0.05, token_delay: float = 0.0,
+               connect_delay: float = 0.0, models_delay: float = 0.0) -> FastAPI:
+    """创建模拟上游应用
+
+    tokens: 每次回复的token数量
+    first_token_delay: 首token前的延迟（秒），模拟上游排队和预填充
+    token_delay: 相邻token之间的延迟（秒）
+    connect_delay: 每条新连接上第一个请求的额外延迟（秒），模拟远端的TCP/TLS握手
+    models_delay: GET /models 的处理延迟（秒），预热请求的真实开销
+    """
+    app = FastAPI()
+    app.state.requests = 0
+    app.state.prompt_bytes = 0
+    app.state.connections = 0
+    app.state.models_requests = 0
+
+    if connect_delay:
+        seen = set()
+
+        @app.middleware("http")
+        async def handshake(request: Request, call_next):
+            # 以客户端 (host, port) 区分连接，新连接先等待模拟的握手时间
+            client = request.scope.get("client")
+            if client not in seen:
+                seen.add(client)
+                app.state.connections += 1
+                await asyncio.sleep(connect_delay)
+            return await call_next(request)
+
+    def chunk(index: int) -> bytes:
+        payload = {
+            "id": "mock",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": "deepseek-chat",
+            "choices": [{"index": 0, "delta": {"content": TOKENS[index % len(TOKENS)]}, "finish_reason": None}],
+        }
+        return b"data: " + json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n\n"
+
+    frames = [chunk(i) for i in range(tokens)]
+
+    @app.get("/stats")
+    async def stats():
+        """计数器，供在其他进程中运行的基准读取"""
+        return {
+            "requests": app.state.requests,
+            "prompt_bytes": app.state.prompt_bytes,
+            "connections": app.state.connections,
+            "models_requests": app.state.models_requests,
+        }
+
+    @app.get("/models")
+    async def models():
+        app.state.models_requests += 1
+        if models_delay:
+            await asyncio.sleep(models_delay)
+        return {"object": "list", "data": [{"id": "deepseek-chat", "object": "model"}]}
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.body()
+        app.state.requests += 1
+        app.state.prompt_bytes += len(body)
+        data = json.loads(body)
+
+        if not data.get("stream"):
+            await asyncio.sleep(first_token_delay + token_delay * tokens)
+            content = "".join(TOKENS[i % len(TOKENS)] for i in range(tokens))
+            return JSONResponse({
+                "id": "mock",
+                "object": "chat.completion",
+                "model": data.get("model", "deepseek-chat"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            })
+
+        async def stream():
+            await asyncio.sleep(first_token_delay)
+            for frame in frames:
+                if token_delay:
+                    await asyncio.sleep(token_delay)
+                yield frame
+            yield b"data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+def main(argv=None):
+    import uvicorn
+    parser = argparse.ArgumentParser(description="模拟Deepseek上游")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--first-token-delay", type=float, default=0.05)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    parser.add_argument("--connect-delay", type=float, default=0.0)
+    parser.add_argument("--models-delay", type=float, default=0.0)
+    args = parser.parse_args(argv)
+    uvicorn.run(create_app(args.tokens, args.first_token_delay, args.token_delay, args.connect_delay,
+                           args.models_delay),
+                host="127.0.0.1", port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""量化向量存储基准：比较Chroma float32（现有路径）与 float16 / int8 量化集合的内存、磁盘占用和 recall@k
+
+真值为float32暴力检索的精确top-k。向量为带簇结构的高斯数据（更接近真实嵌入分布），
+rescore_factor=1 时等价于只用编码排序、不做全精度重排序。
+
+用法（在backend目录下）：
+    python -m benchmarks.quantization --vectors 20000 --dim 1536 --queries 200 --k 10
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+from .common import BACKEND_DIR, summarize, dump
+
+def make_dataset(n: int, dim: int, queries: int, clusters: int, seed: int):
+    """生成带簇结构的向量及查询（查询为数据点加噪声）"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    data = centers[labels] + 0.5 * rng.normal(size=(n, dim)).astype(np.float32)
+    picks = rng.integers(0, n, size=queries)
+    query_vectors = data[picks] + 0.3 * rng.normal(size=(queries, dim)).astype(np.float32)
+    return data.astype(np.float32), query_vectors.astype(np.float32)
+
+def exact_topk(data: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    norms = np.einsum("ij,ij->i", data, data)
+    result = []
+    for q in queries:
+        distances = norms - 2.0 * (data @ q)
+        top = np.argpartition(distances, k)[:k]
+        result.append(top[np.argsort(distances[top])])
+    return np.array(result)
+
+def directory_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+def evaluate(collection, queries: np.ndarray, truth: np.ndarray, k: int):
+    """返回 recall@k 和单次查询延迟"""
+    latencies = []
+    hits = 0
+    for q, expected in zip(queries, truth):
+        t = time.perf_counter()
+        result = collection.query(query_embeddings=[q.tolist()], n_results=k, include=["distances"])
+        latencies.append(time.perf_counter() - t)
+        found = {int(i) for i in result["ids"][0]}
+        hits += len(found & {int(i) for i in expected})
+    return hits / (len(queries) * k), summarize(latencies)
+
+def load(collection, data: np.ndarray, batch: int):
+    start = time.perf_counter()
+    for offset in range(0, len(data), batch):
+        block = data[offset:offset + batch]
+        collection.add(
+            ids=[str(i) for i in range(offset, offset + len(block))],
+            embeddings=block.tolist(),
+            documents=[f"doc {i}" for i in range(offset, offset + len(block))],
+            metadatas=[{"row": i} for i in range(offset, offset + len(block))],
+        )
+    return time.perf_counter() - start
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="量化向量存储基准")
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=4000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-chroma", action="store_true", help="跳过Chroma基线（大规模时入库较慢）")
+    parser.add_argument("--output", help="结果JSON输出路径，默认标准输出")
+    args = parser.parse_args(argv)
+
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    from app.services.quantized_store import QuantizedCollection
+
+    data, queries = make_dataset(args.vectors, args.dim, args.queries, args.clusters, args.seed)
+    truth = exact_topk(data, queries, args.k)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if not args.skip_chroma:
+            import chromadb
+            from chromadb.config import Settings
+            path = os.path.join(workdir, "chroma")
+            client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+            collection = client.create_collection(name="benchmark")
+            load_seconds = load(collection, data, args.batch)
+            recall, latency = evaluate(collection, queries, truth, args.k)
+            results["chroma_float32"] = {
+                "load_seconds": load_seconds,
+                "vector_memory_bytes": data.nbytes,
+                "disk_bytes": directory_bytes(path),
+                f"recall_at_{args.k}": recall,
+                "latency_seconds": latency,
+            }
+
+        for dtype in ("float16", "int8"):
+            for factor in (1, args.rescore_factor):
+                collection = QuantizedCollection(os.path.join(workdir, "quantized"), f"{dtype}_{factor}",
+                                                 dtype=dtype, rescore_factor=factor)
+                load_seconds = load(collection, data, args.batch)
+                recall, latency = evaluate(collection, queries, truth, args.k)
+                results[f"{dtype}_rescore_{factor}"] = {
+                    "load_seconds": load_seconds,
+                    "vector_memory_bytes": collection.memory_bytes(),
+                    "disk_bytes": directory_bytes(collection.directory),
+                    f"recall_at_{args.k}": recall,
+                    "latency_seconds": latency,
+                }
+
+    dump({"benchmark": "quantization", "parameters": vars(args), "modes": results}, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""可复现的基准套件：文档入库、语义检索以及 /api/chat、/api/chat/stream 端到端
+
+上游使用本地模拟的Deepseek SSE服务（benchmarks/mock_upstream.py），不访问真实API。
+ingest/search 在本进程内直接调用 DocumentProcessor；chat/chat_stream 的后端应用和模拟上游
+各自运行在子进程中，测得的延迟不包含发压客户端和模拟上游占用的CPU。
+peak_rss_mb 为被测对象（ingest/search 为本进程，端到端场景为后端子进程）在该场景期间的峰值
+常驻内存：每个场景开始前重置峰值（仅Linux支持；不支持时为进程启动以来的峰值）。
+
+用法（在backend目录下）：
+    python -m benchmarks.run --size small --output result.json
+    python -m benchmarks.run --size small --save-baseline baseline.json
+    python -m benchmarks.run --size small --baseline baseline.json --tolerance 0.2
+
+与基线比较时，吞吐量（*_per_second）下降或延迟分位数（p50/p95/p99）、峰值内存上升
+超过容差即视为退化，进程以退出码1结束。
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+import argparse
+import tempfile
+import platform
+from contextlib import ExitStack
+from typing import Dict, Any, List, Callable
+import httpx
+from .common import BACKEND_DIR, summarize, dump, peak_rss_mb, reset_peak_rss, ServerProcess
+from .corpus import generate_corpus, sample_queries
+
+SIZES = {
+    "small": {"documents": 20, "chars": 5000, "queries": 200, "requests": 100, "concurrency": 8},
+    "medium": {"documents": 200, "chars": 20000, "queries": 1000, "requests": 500, "concurrency": 16},
+    "large": {"documents": 1000, "chars": 50000, "queries": 2000, "requests": 1000, "concurrency": 32},
+}
+
+class BenchContext:
+    """场景间共享的状态：语料、临时目录、已入库的处理器和端到端服务"""
+
+    def __init__(self, args, workdir: str, stack: ExitStack):
+        self.args = args
+        self.workdir = workdir
+        self.stack = stack
+        self.corpus = generate_corpus(
+            os.path.join(workdir, "corpus"), args.documents, args.chars,
+            language=args.language, seed=args.seed
+        )
+        self.queries = sample_queries(self.corpus, args.queries, seed=args.seed)
+        self.processor = None
+        self.app_server = None
+        self.knowledge_base_id = None
+
+    async def ingested_processor(self):
+        """返回已导入全部语料的 DocumentProcessor（首次调用时入库）"""
+        if self.processor is None:
+            await bench_ingest(self)
+        return self.processor
+
+    async def app_with_knowledge_base(self):
+        """启动模拟上游和后端应用，通过API创建知识库并上传语料，返回 (base_url, kb_id)"""
+        if self.app_server is None:
+            upstream = self.stack.enter_context(ServerProcess(
+                ["benchmarks.mock_upstream", "--port", "{port}", "--tokens", str(self.args.tokens),
+                 "--first-token-delay", str(self.args.first_token_delay)],
+                ready_path="/models"
+            ))
+            self.app_server = self.stack.enter_context(ServerProcess(
+                ["uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", "{port}", "--log-level", "warning"],
+                env={
+                    "DEEPSEEK_API_KEY": "benchmark-key",
+                    "DEEPSEEK_BASE_URL": upstream.base_url,
+                    "RAG_PERSIST_DIRECTORY": os.path.join(self.workdir, "app_db"),
+                },
+                # 后端把上传文件写到工作目录下的 uploads/
+                cwd=self.workdir
+            ))
+
+            async with httpx.AsyncClient(base_url=self.app_server.base_url, timeout=120.0) as client:
+                kb = (await client.post("/api/knowledge-bases", json={"name": "benchmark"})).json()
+                self.knowledge_base_id = kb["id"]
+                for path in self.corpus:
+                    with open(path, "rb") as f:
+                        response = await client.post(
+                            "/api/documents",
+                            data={"knowledge_base_id": self.knowledge_base_id},
+                            files={"file": (os.path.basename(path), f, "text/plain")}
+                        )
+                    response.raise_for_status()
+        return self.app_server.base_url, self.knowledge_base_id
+
+async def bench_ingest(ctx: BenchContext) -> Dict[str, Any]:
+    """DocumentProcessor.process_file 入库吞吐和单文档延迟"""
+    from app.services.chroma_manager import DocumentProcessor
+    processor = DocumentProcessor(persist_directory=os.path.join(ctx.workdir, "direct_db"))
+    latencies = []
+    chunks = 0
+    start = time.perf_counter()
+    for path in ctx.corpus:
+        t = time.perf_counter()
+        result = await processor.process_file(file_path=path, knowledge_base_id="benchmark")
+        latencies.append(time.perf_counter() - t)
+        chunks += result["chunks_count"]
+    elapsed = time.perf_counter() - start
+    ctx.processor = processor
+    return {
+        "documents": len(ctx.corpus),
+        "chunks": chunks,
+        "documents_per_second": len(ctx.corpus) / elapsed,
+        "chunks_per_second": chunks / elapsed,
+        "latency_seconds": summarize(latencies),
+    }
+
+async def bench_search(ctx: BenchContext) -> Dict[str, Any]:
+    """DocumentProcessor.semantic_search 延迟和每秒查询数"""
+    processor = await ctx.ingested_processor()
+    latencies = []
+    start = time.perf_counter()
+    for query in ctx.queries:
+        t = time.perf_counter()
+        await processor.semantic_search(query=query, knowledge_base_id="benchmark")
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+    return {
+        "queries": len(ctx.queries),
+        "queries_per_second": len(ctx.queries) / elapsed,
+        "latency_seconds": summarize(latencies),
+    }
+
+async def _drive(ctx: BenchContext, request: Callable) -> Dict[str, Any]:
+    """以固定并发发送 ctx.args.requests 个请求，request(client, query) 返回单次结果字典"""
+    base_url, _ = await ctx.app_with_knowledge_base()
+    semaphore = asyncio.Semaphore(ctx.args.concurrency)
+    limits = httpx.Limits(max_connections=ctx.args.concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits) as client:
+        async def one(i: int):
+            async with semaphore:
+                return await request(client, ctx.queries[i % len(ctx.queries)])
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one(i) for i in range(ctx.args.requests)))
+        elapsed = time.perf_counter() - start
+    return {"results": results, "elapsed": elapsed}
+
+async def bench_chat(ctx: BenchContext) -> Dict[str, Any]:
+    """/api/chat 端到端延迟和吞吐"""
+    _, kb_id = await ctx.app_with_knowledge_base()
+
+    async def request(client: httpx.AsyncClient, query: str):
+        t = time.perf_counter()
+        response = await client.post("/api/chat", json={
+            "messages": [{"role": "user", "content": query}],
+            "knowledge_base_id": kb_id,
+        })
+        response.raise_for_status()
+        return {"latency": time.perf_counter() - t}
+
+    run = await _drive(ctx, request)
+    return {
+        "requests": len(run["results"]),
+        "concurrency": ctx.args.concurrency,
+        "requests_per_second": len(run["results"]) / run["elapsed"],
+        "latency_seconds": summarize([r["latency"] for r in run["results"]]),
+    }
+
+async def bench_chat_stream(ctx: BenchContext) -> Dict[str, Any]:
+    """/api/chat/stream 端到端首字节延迟、总延迟和吞吐"""
+    _, kb_id = await ctx.app_with_knowledge_base()
+
+    async def request(client: httpx.AsyncClient, query: str):
+        t = time.perf_counter()
+        first = None
+        received = 0
+        async with client.stream("POST", "/api/chat/stream", json={
+            "messages": [{"role": "user", "content": query}],
+            "knowledge_base_id": kb_id,
+        }) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                if first is None:
+                    first = time.perf_counter() - t
+                received += len(chunk)
+        return {"latency": time.perf_counter() - t, "first_byte": first or 0.0, "bytes": received}
+
+    run = await _drive(ctx, request)
+    return {
+        "requests": len(run["results"]),
+        "concurrency": ctx.args.concurrency,
+        "requests_per_second": len(run["results"]) / run["elapsed"],
+        "bytes_per_second": sum(r["bytes"] for r in run["results"]) / run["elapsed"],
+        "time_to_first_byte_seconds": summarize([r["first_byte"] for r in run["results"]]),
+        "latency_seconds": summarize([r["latency"] for r in run["results"]]),
+    }
+
+SCENARIOS = {
+    "ingest": bench_ingest,
+    "search": bench_search,
+    "chat": bench_chat,
+    "chat_stream": bench_chat_stream,
+}
+
+# 在后端子进程中运行的端到端场景
+END_TO_END = ("chat", "chat_stream")
+
+def _flatten(data: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in data.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = float(value)
+    return flat
+
+def _direction(path: str) -> int:
+    """指标方向：1 越大越好，-1 越小越好，0 不参与比较"""
+    leaf = path.rsplit(".", 1)[-1]
+    if leaf.endswith("_per_second"):
+        return 1
+    if leaf in ("p50", "p95", "p99") or leaf == "peak_rss_mb":
+        return -1
+    return 0
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """与基线比较，返回退化项列表"""
+    current = _flatten(result["scenarios"])
+    previous = _flatten(baseline.get("scenarios", {}))
+    regressions = []
+    for path, old in previous.items():
+        direction = _direction(path)
+        if direction == 0 or path not in current or old == 0:
+            continue
+        change = (current[path] - old) / abs(old)
+        if change * direction < -tolerance:
+            regressions.append({"metric": path, "baseline": old, "current": current[path], "change": change})
+    return regressions
+
+async def run_scenarios(ctx: BenchContext, names: List[str]) -> Dict[str, Any]:
+    results = {}
+    for name in names:
+        if name in END_TO_END:
+            # 先完成服务启动和语料上传，峰值内存只统计场景本身
+            await ctx.app_with_knowledge_base()
+            pid = ctx.app_server.pid
+        else:
+            pid = None
+        reset_peak_rss(pid)
+        result = await SCENARIOS[name](ctx)
+        result["peak_rss_mb"] = peak_rss_mb(pid)
+        results[name] = result
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Deepseek RAG 基准套件")
+    parser.add_argument("--size", choices=sorted(SIZES), default="small", help="预设规模")
+    parser.add_argument("--documents", type=int, help="语料文档数")
+    parser.add_argument("--chars", type=int, help="每个文档的字符数")
+    parser.add_argument("--queries", type=int, help="检索查询数")
+    parser.add_argument("--requests", type=int, help="端到端请求数")
+    parser.add_argument("--concurrency", type=int, help="端到端并发数")
+    parser.add_argument("--language", choices=["zh", "en", "mixed"], default="mixed")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tokens", type=int, default=64, help="模拟上游每次回复的token数")
+    parser.add_argument("--first-token-delay", type=float, default=0.05, help="模拟上游首token延迟（秒）")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="逗号分隔的场景列表")
+    parser.add_argument("--output", help="结果JSON输出路径，默认标准输出")
+    parser.add_argument("--baseline", help="基线JSON路径，用于退化检测")
+    parser.add_argument("--save-baseline", help="把本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的相对退化比例")
+    args = parser.parse_args(argv)
+    for key, value in SIZES[args.size].items():
+        if getattr(args, key) is None:
+            setattr(args, key, value)
+
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知场景: {', '.join(unknown)}")
+
+    # 后端把上传文件写到工作目录下的 uploads/，基准期间切换到临时目录避免污染仓库
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir, ExitStack() as stack:
+        os.chdir(workdir)
+        try:
+            ctx = BenchContext(args, workdir, stack)
+            scenarios = asyncio.run(run_scenarios(ctx, names))
+        finally:
+            os.chdir(cwd)
+
+    result = {
+        "benchmark": "rag",
+        "size": args.size,
+        "parameters": {k: getattr(args, k) for k in ("documents", "chars", "queries", "requests",
+                                                      "concurrency", "language", "seed", "tokens",
+                                                      "first_token_delay")},
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "scenarios": scenarios,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        result["regressions"] = compare(result, baseline, args.tolerance)
+        exit_code = 1 if result["regressions"] else 0
+
+    dump(result, args.output)
+    if args.save_baseline:
+        dump(result, args.save_baseline)
+    sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()
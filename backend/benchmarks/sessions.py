@@ -0,0 +1,98 @@
+"""会话基准：多轮对话中比较"每轮重发完整历史"与"服务端会话只发新消息"
+
+记录每轮的请求体大小、上游收到的提示大小（由模拟上游统计）和端到端延迟。
+模拟上游和后端各自运行在独立的子进程中。
+
+用法（在backend目录下）：
+    python -m benchmarks.sessions --turns 50
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import httpx
+from .common import BACKEND_DIR, summarize, dump, ServerProcess
+from .corpus import generate_document
+
+def run_conversation(base_url: str, upstream: httpx.Client, turns: int, use_session: bool, seed: int):
+    rng = random.Random(seed)
+    history = []
+    per_turn = []
+    with httpx.Client(base_url=base_url, timeout=60.0) as client:
+        session_id = client.post("/api/sessions").json()["id"] if use_session else None
+        for _ in range(turns):
+            user = {"role": "user", "content": generate_document(rng, 200, rng.choice(["zh", "en"]))}
+            if use_session:
+                payload = {"messages": [user], "session_id": session_id}
+            else:
+                history.append(user)
+                payload = {"messages": history}
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+            prompt_before = upstream.get("/stats").json()["prompt_bytes"]
+            t = time.perf_counter()
+            response = client.post("/api/chat", content=body, headers={"Content-Type": "application/json"})
+            latency = time.perf_counter() - t
+            response.raise_for_status()
+            if not use_session:
+                history.append({"role": "assistant", "content": response.json()["message"]})
+            per_turn.append({
+                "request_bytes": len(body),
+                "upstream_prompt_bytes": upstream.get("/stats").json()["prompt_bytes"] - prompt_before,
+                "latency": latency,
+            })
+    return {
+        "turns": turns,
+        "total_request_bytes": sum(t["request_bytes"] for t in per_turn),
+        "last_request_bytes": per_turn[-1]["request_bytes"],
+        "total_upstream_prompt_bytes": sum(t["upstream_prompt_bytes"] for t in per_turn),
+        "last_upstream_prompt_bytes": per_turn[-1]["upstream_prompt_bytes"],
+        "latency_seconds": summarize([t["latency"] for t in per_turn]),
+        "per_turn": per_turn,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="服务端会话基准")
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--tokens", type=int, default=64, help="模拟上游每次回复的token数")
+    parser.add_argument("--first-token-delay", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--per-turn", action="store_true", help="输出每轮明细")
+    parser.add_argument("--output", help="结果JSON输出路径，默认标准输出")
+    args = parser.parse_args(argv)
+
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    upstream_server = ServerProcess(
+        ["benchmarks.mock_upstream", "--port", "{port}", "--tokens", str(args.tokens),
+         "--first-token-delay", str(args.first_token_delay)],
+        ready_path="/stats"
+    )
+    with tempfile.TemporaryDirectory() as workdir, upstream_server, \
+            httpx.Client(base_url=upstream_server.base_url) as upstream:
+        server = ServerProcess(
+            ["uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", "{port}", "--log-level", "warning"],
+            env={
+                "DEEPSEEK_API_KEY": "benchmark-key",
+                "DEEPSEEK_BASE_URL": upstream_server.base_url,
+                "RAG_PERSIST_DIRECTORY": os.path.join(workdir, "db"),
+                "RAG_WARMUP": "0",
+            },
+            cwd=workdir
+        )
+        with server:
+            results = {
+                "stateless": run_conversation(server.base_url, upstream, args.turns, False, args.seed),
+                "session": run_conversation(server.base_url, upstream, args.turns, True, args.seed),
+            }
+
+    if not args.per_turn:
+        for result in results.values():
+            result.pop("per_turn")
+    dump({"benchmark": "sessions", "parameters": vars(args), "modes": results}, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""分片扩展基准：分片数变化时的入库吞吐和检索延迟
+
+每种分片数使用独立的向量库目录：先以固定并发上传全部语料（process_file），
+再顺序执行检索查询，并用同样的并发测每秒查询数。
+
+用法（在backend目录下）：
+    python -m benchmarks.shards --shards 1,2,4,8 --documents 40 --chars 20000
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+from .common import BACKEND_DIR, summarize, dump, peak_rss_mb
+from .corpus import generate_corpus, sample_queries
+
+async def gather_limited(concurrency: int, jobs):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(job):
+        async with semaphore:
+            return await job
+
+    return await asyncio.gather(*(one(job) for job in jobs))
+
+async def run_shards(args, workdir: str, corpus, queries, shards: int):
+    from app.services.chroma_manager import DocumentProcessor
+    processor = DocumentProcessor(
+        persist_directory=os.path.join(workdir, f"db_{shards}"),
+        vector_storage=args.storage,
+        shards=shards
+    )
+
+    start = time.perf_counter()
+    results = await gather_limited(args.concurrency, [
+        processor.process_file(file_path=path, knowledge_base_id="benchmark") for path in corpus
+    ])
+    ingest_seconds = time.perf_counter() - start
+    chunks = sum(r["chunks_count"] for r in results)
+
+    latencies = []
+    for query in queries:
+        t = time.perf_counter()
+        await processor.semantic_search(query=query, knowledge_base_id="benchmark", top_k=args.k)
+        latencies.append(time.perf_counter() - t)
+
+    start = time.perf_counter()
+    await gather_limited(args.concurrency, [
+        processor.semantic_search(query=query, knowledge_base_id="benchmark", top_k=args.k) for query in queries
+    ])
+    concurrent_seconds = time.perf_counter() - start
+
+    return {
+        "chunks": chunks,
+        "chunks_per_shard": [c.count() for c in processor._shard_collections("benchmark")],
+        "ingest_chunks_per_second": chunks / ingest_seconds,
+        "search_latency_seconds": summarize(latencies),
+        "concurrent_queries_per_second": len(queries) / concurrent_seconds,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+async def run(args, workdir: str):
+    corpus = generate_corpus(os.path.join(workdir, "corpus"), args.documents, args.chars, args.language, args.seed)
+    queries = sample_queries(corpus, args.queries)
+    results = {}
+    for shards in [int(s) for s in args.shards.split(",")]:
+        results[f"shards_{shards}"] = await run_shards(args, workdir, corpus, queries, shards)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="分片扩展基准")
+    parser.add_argument("--shards", default="1,2,4,8", help="逗号分隔的分片数列表")
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--chars", type=int, default=20000)
+    parser.add_argument("--language", choices=["zh", "en", "mixed"], default="mixed")
+    parser.add_argument("--storage", choices=["float32", "float16", "int8"], default="float32")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="结果JSON输出路径，默认标准输出")
+    args = parser.parse_args(argv)
+
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    with tempfile.TemporaryDirectory() as workdir:
+        results = asyncio.run(run(args, workdir))
+    dump({"benchmark": "shards", "parameters": vars(args), "modes": results}, args.output)
+
+if __name__ == "__main__":
+    main()
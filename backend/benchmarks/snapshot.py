@@ -0,0 +1,88 @@
+"""知识库快照基准：比较"从原始文件重新入库"与"导出快照再导入"的耗时
+
+重新入库包括解析、切分、嵌入和写入；导入只把快照中的文本块和嵌入直接写入向量库。
+基准还记录快照大小，以及导入后检索结果与原知识库的 top-k 重合率
+（Chroma 的HNSW索引是近似的，插入顺序不同时结果可能有细微差别）。
+
+用法（在backend目录下）：
+    python -m benchmarks.snapshot --documents 30 --chars 20000
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+from .common import BACKEND_DIR, dump, peak_rss_mb
+from .corpus import generate_corpus, sample_queries
+
+async def top_ids(processor, knowledge_base_id: str, queries, k: int):
+    results = []
+    for query in queries:
+        hits = await processor.semantic_search(query=query, knowledge_base_id=knowledge_base_id, top_k=k)
+        results.append([(hit["document_name"], hit["content"]) for hit in hits])
+    return results
+
+async def run(args, workdir: str):
+    from app.services.chroma_manager import DocumentProcessor
+    from app.services.snapshot import write_snapshot, read_snapshot
+
+    corpus = generate_corpus(os.path.join(workdir, "corpus"), args.documents, args.chars, args.language, args.seed)
+    queries = sample_queries(corpus, args.queries)
+    results = {}
+
+    processor = DocumentProcessor(persist_directory=os.path.join(workdir, "source_db"), vector_storage=args.storage)
+    start = time.perf_counter()
+    chunks = 0
+    for path in corpus:
+        chunks += (await processor.process_file(file_path=path, knowledge_base_id="source"))["chunks_count"]
+    results["reingest"] = {"seconds": time.perf_counter() - start, "chunks": chunks}
+
+    snapshot_path = os.path.join(workdir, "source.ragsnap")
+    start = time.perf_counter()
+    header = {
+        "knowledge_base": {"id": "source"},
+        "documents": [],
+        "count": processor.count_chunks("source"),
+        "dim": processor.vector_dimension("source"),
+    }
+    with open(snapshot_path, "wb") as f:
+        for data in write_snapshot(header, processor.export_batches("source")):
+            f.write(data)
+    results["export"] = {"seconds": time.perf_counter() - start, "bytes": os.path.getsize(snapshot_path)}
+
+    target = DocumentProcessor(persist_directory=os.path.join(workdir, "target_db"), vector_storage=args.storage)
+    start = time.perf_counter()
+    with open(snapshot_path, "rb") as f:
+        _, batches = read_snapshot(f)
+        imported = target.import_batches("target", batches)
+    results["import"] = {"seconds": time.perf_counter() - start, "chunks": imported}
+    results["import_speedup"] = results["reingest"]["seconds"] / results["import"]["seconds"]
+
+    expected = await top_ids(processor, "source", queries, args.k)
+    actual = await top_ids(target, "target", queries, args.k)
+    overlap = sum(len(set(e) & set(a)) for e, a in zip(expected, actual))
+    results["search_overlap"] = overlap / max(1, sum(len(e) for e in expected))
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="知识库快照导出/导入基准")
+    parser.add_argument("--documents", type=int, default=30)
+    parser.add_argument("--chars", type=int, default=20000)
+    parser.add_argument("--language", choices=["zh", "en", "mixed"], default="mixed")
+    parser.add_argument("--storage", choices=["float32", "float16", "int8"], default="float32")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="结果JSON输出路径，默认标准输出")
+    args = parser.parse_args(argv)
+
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    with tempfile.TemporaryDirectory() as workdir:
+        results = asyncio.run(run(args, workdir))
+    dump({"benchmark": "snapshot", "parameters": vars(args), "results": results}, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""启动性能基准：测量 app.main 的导入耗时，以及 uvicorn 进程从启动到首个请求成功的耗时
+
+用法（在backend目录下）：
+    python -m benchmarks.startup --repeat 5 --output startup.json
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+import tempfile
+import httpx
+from .common import BACKEND_DIR, free_port, summarize, dump
+
+IMPORT_SNIPPET = (
+    "import time; t = time.perf_counter(); import app.main; "
+    "print(time.perf_counter() - t)"
+)
+
+def _bench_env(persist_dir: str) -> dict:
+    env = os.environ.copy()
+    env.setdefault("DEEPSEEK_API_KEY", "benchmark-key")
+    env["RAG_PERSIST_DIRECTORY"] = persist_dir
+    return env
+
+def measure_import(env: dict) -> float:
+    """在全新解释器中导入 app.main，返回导入耗时（秒）"""
+    output = subprocess.check_output(
+        [sys.executable, "-c", IMPORT_SNIPPET], cwd=BACKEND_DIR, env=env, text=True
+    )
+    return float(output.strip().splitlines()[-1])
+
+def _wait_for(url: str, started: float, timeout: float) -> float:
+    """轮询URL直到返回200，返回距离进程启动的耗时"""
+    deadline = started + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if httpx.get(url, timeout=0.5).status_code == 200:
+                return time.perf_counter() - started
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.005)
+    raise TimeoutError(f"等待 {url} 超时")
+
+def measure_first_request(env: dict, timeout: float = 60.0) -> dict:
+    """启动uvicorn，分别测量 /health（存活）和 /ready（就绪）首次成功的耗时"""
+    port = free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    try:
+        base = f"http://127.0.0.1:{port}"
+        live = _wait_for(f"{base}/health", started, timeout)
+        ready = _wait_for(f"{base}/ready", started, timeout)
+        return {"first_request": live, "ready": ready}
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API进程启动性能基准")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数")
+    parser.add_argument("--output", default=None, help="结果JSON输出路径，默认标准输出")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as persist_dir:
+        env = _bench_env(persist_dir)
+        import_times = [measure_import(env) for _ in range(args.repeat)]
+        runs = [measure_first_request(env) for _ in range(args.repeat)]
+
+    dump({
+        "benchmark": "startup",
+        "import_seconds": summarize(import_times),
+        "time_to_first_request_seconds": summarize([r["first_request"] for r in runs]),
+        "time_to_ready_seconds": summarize([r["ready"] for r in runs]),
+    }, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""流式转发开销基准
+
+客户端层比较：改造前的实现（每请求新建连接 + 逐行json解析）、字节块解析（chat_stream）
+和透传（chat_stream_raw）；路由层直接调用ASGI应用的 /api/chat/stream，比较 text 与 sse 两种输出格式。
+
+模拟上游在独立子进程中运行，因此本进程的CPU时间只包含解析与转发的开销，
+tokens_per_cpu_second 即单核每秒可处理的token数。
+
+用法（在backend目录下）：
+    python -m benchmarks.stream --streams 200 --concurrency 20 --tokens 256
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import httpx
+from .common import BACKEND_DIR, dump, ServerProcess
+
+async def legacy_stream(client, messages, model):
+    """改造前的实现：每个请求新建AsyncClient，aiter_lines + 每行json.loads，每个token单独输出"""
+    data = {
+        "model": model,
+        "messages": [{"role": m.role, "content": m.content} for m in messages],
+        "temperature": 0.7,
+        "stream": True
+    }
+    async with httpx.AsyncClient() as http, http.stream(
+        "POST", f"{client.base_url}/chat/completions", json=data, headers=client.headers, timeout=30.0
+    ) as response:
+        async for line in response.aiter_lines():
+            if not line.strip():
+                continue
+            if line.startswith("data: "):
+                json_data = line[6:].strip()
+                if json_data == "[DONE]":
+                    break
+                try:
+                    data = json.loads(json_data)
+                    delta = data.get("choices", [{}])[0].get("delta", {})
+                    if "content" in delta and delta["content"]:
+                        yield delta["content"]
+                except json.JSONDecodeError:
+                    continue
+
+def _upstream(tokens: int) -> ServerProcess:
+    return ServerProcess(
+        ["benchmarks.mock_upstream", "--port", "{port}", "--tokens", str(tokens), "--first-token-delay", "0"],
+        ready_path="/models"
+    )
+
+def _client_stream(open_stream):
+    """客户端层：直接迭代 DeepseekClient 的流，返回输出块数"""
+    from app.models.schemas import ChatMessage
+    messages = [ChatMessage(role="user", content="benchmark")]
+
+    async def run():
+        outputs = 0
+        async for _ in open_stream(messages, model="deepseek-chat"):
+            outputs += 1
+        return outputs
+    return run
+
+def _route_stream(app, stream_format: str):
+    """路由层：直接调用ASGI应用的 /api/chat/stream，丢弃响应体，返回响应消息数"""
+    body = json.dumps({
+        "messages": [{"role": "user", "content": "benchmark"}],
+        "stream_format": stream_format,
+    }).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/api/chat/stream", "raw_path": b"/api/chat/stream",
+        "root_path": "", "query_string": b"", "headers": [(b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 80),
+    }
+
+    async def run():
+        outputs = 0
+        finished = asyncio.Event()
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await finished.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal outputs
+            if message["type"] == "http.response.body" and message.get("body"):
+                outputs += 1
+
+        await app(scope, receive, send)
+        finished.set()
+        return outputs
+    return run
+
+async def _run_mode(run_one, streams: int, concurrency: int, tokens: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    outputs = 0
+
+    async def one():
+        nonlocal outputs
+        async with semaphore:
+            count = await run_one()
+        outputs += count
+
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    await asyncio.gather(*(one() for _ in range(streams)))
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    total_tokens = streams * tokens
+    return {
+        "streams": streams,
+        "tokens": total_tokens,
+        "output_chunks": outputs,
+        "wall_seconds": wall,
+        "cpu_seconds": cpu,
+        "tokens_per_second": total_tokens / wall,
+        "tokens_per_cpu_second": total_tokens / cpu if cpu else 0.0,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="流式转发开销基准")
+    parser.add_argument("--streams", type=int, default=200, help="总流数")
+    parser.add_argument("--concurrency", type=int, default=20, help="并发流数")
+    parser.add_argument("--tokens", type=int, default=256, help="每个流的token数")
+    parser.add_argument("--output", help="结果JSON输出路径，默认标准输出")
+    args = parser.parse_args(argv)
+
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    with _upstream(args.tokens) as upstream:
+        os.environ["DEEPSEEK_API_KEY"] = "benchmark-key"
+        os.environ["DEEPSEEK_BASE_URL"] = upstream.base_url
+        os.environ["RAG_WARMUP"] = "0"
+        from app.services.deepseek import DeepseekClient
+        from app.services import sse
+        import app.main as main_module
+
+        def client_mode(method: str):
+            # 每种模式在新的事件循环中运行，连接池不能跨循环复用，因此每次新建客户端
+            client = DeepseekClient()
+            if method == "legacy":
+                return _client_stream(lambda m, model: legacy_stream(client, m, model))
+            return _client_stream(getattr(client, method))
+
+        def route_mode(stream_format: str):
+            main_module._deepseek_client = None
+            return _route_stream(main_module.app, stream_format)
+
+        modes = {
+            "client_lines_json": lambda: client_mode("legacy"),
+            "client_chunk_parser": lambda: client_mode("chat_stream"),
+            "client_passthrough": lambda: client_mode("chat_stream_raw"),
+            "route_text": lambda: route_mode("text"),
+            "route_sse": lambda: route_mode("sse"),
+        }
+        results = {}
+        for name, make in modes.items():
+            results[name] = asyncio.run(_run_mode(make(), args.streams, args.concurrency, args.tokens))
+
+    dump({
+        "benchmark": "stream",
+        "parameters": vars(args),
+        "json_backend": sse._loads.__module__,
+        "modes": results,
+    }, args.output)
+
+if __name__ == "__main__":
+    main()
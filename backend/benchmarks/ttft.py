@@ -0,0 +1,135 @@
+"""首token时间（TTFT）基准：比较串行流水线、检索期间预热上游连接、预取检索三种方式
+
+模拟上游对每条新连接的第一个请求增加 --connect-delay 的延迟（模拟TCP/TLS握手），
+后端连接的保活时间设为 --keepalive，请求间隔 --idle 大于保活时间，
+即流量稀疏、每次请求都要重新建连的情况。预热请求 GET /models 本身耗时 --models-delay。
+预热在后台进行，聊天请求不等待它完成。
+prefetch 模式先调用 /api/search/prefetch，等待 --think-time（模拟用户输入）后再发起聊天。
+
+模拟上游和每种模式的后端都运行在独立的子进程中，与发压的基准进程不共享GIL。
+客户端测得的TTFT与服务端 rag_time_to_first_token_seconds 指标的均值一起输出，用于互相校验。
+
+用法（在backend目录下）：
+    python -m benchmarks.ttft --requests 20 --connect-delay 0.05
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import httpx
+from .common import BACKEND_DIR, summarize, dump, ServerProcess
+from .corpus import generate_corpus, sample_queries
+
+METRIC = 'rag_time_to_first_token_seconds_{}{{pipeline="chat_stream"}}'
+
+def server_ttft(client: httpx.Client):
+    """从 /metrics 读取服务端TTFT直方图的 (sum, count)"""
+    values = {}
+    for line in client.get("/metrics").text.splitlines():
+        for field in ("sum", "count"):
+            if line.startswith(METRIC.format(field)):
+                values[field] = float(line.rsplit(" ", 1)[1])
+    return values.get("sum", 0.0), values.get("count", 0.0)
+
+def run_mode(client: httpx.Client, upstream: httpx.Client, kb_id: str, queries, args, prefetch: bool):
+    ttfts = []
+    totals = []
+    sum_before, count_before = server_ttft(client)
+    stats_before = upstream.get("/stats").json()
+    for query in queries:
+        time.sleep(args.idle)
+        payload = {"messages": [{"role": "user", "content": query}], "knowledge_base_id": kb_id}
+        if prefetch:
+            response = client.post("/api/search/prefetch", json={"knowledge_base_id": kb_id, "query": query})
+            response.raise_for_status()
+            payload["prefetch_id"] = response.json()["prefetch_id"]
+            time.sleep(args.think_time)
+
+        start = time.perf_counter()
+        first = None
+        with client.stream("POST", "/api/chat/stream", json=payload) as response:
+            response.raise_for_status()
+            for _ in response.iter_bytes():
+                if first is None:
+                    first = time.perf_counter() - start
+        ttfts.append(first or 0.0)
+        totals.append(time.perf_counter() - start)
+
+    sum_after, count_after = server_ttft(client)
+    stats_after = upstream.get("/stats").json()
+    return {
+        "ttft_seconds": summarize(ttfts),
+        "server_ttft_mean_seconds": (sum_after - sum_before) / max(1.0, count_after - count_before),
+        "latency_seconds": summarize(totals),
+        "upstream_connections": stats_after["connections"] - stats_before["connections"],
+        "warmup_requests": stats_after["models_requests"] - stats_before["models_requests"],
+    }
+
+def run_app(args, workdir: str, upstream_url: str, upstream: httpx.Client, corpus, queries, mode: str,
+            warmup: bool, prefetch: bool):
+    """每种模式启动一个独立的后端进程（预热开关在启动时由环境变量决定），入库后测量"""
+    app_dir = os.path.join(workdir, mode)
+    os.makedirs(app_dir)
+    server = ServerProcess(
+        ["uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", "{port}", "--log-level", "warning"],
+        env={
+            "DEEPSEEK_API_KEY": "benchmark-key",
+            "DEEPSEEK_BASE_URL": upstream_url,
+            "DEEPSEEK_KEEPALIVE_EXPIRY": str(args.keepalive),
+            "RAG_PERSIST_DIRECTORY": os.path.join(app_dir, "db"),
+            "RAG_VECTOR_STORAGE": args.storage,
+            "RAG_UPSTREAM_WARMUP": "1" if warmup else "0",
+        },
+        # 后端把上传文件写到工作目录下的 uploads/
+        cwd=app_dir
+    )
+    with server, httpx.Client(base_url=server.base_url, timeout=120.0) as client:
+        kb_id = client.post("/api/knowledge-bases", json={"name": "benchmark"}).json()["id"]
+        for path in corpus:
+            with open(path, "rb") as f:
+                client.post("/api/documents", data={"knowledge_base_id": kb_id},
+                            files={"file": (os.path.basename(path), f, "text/plain")}).raise_for_status()
+
+        # 先发一个不计入结果的请求，排除首次检索和首次建连的影响
+        client.post("/api/chat", json={"messages": [{"role": "user", "content": queries[0]}],
+                                       "knowledge_base_id": kb_id}).raise_for_status()
+        return run_mode(client, upstream, kb_id, queries, args, prefetch)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="首token时间基准")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--chars", type=int, default=20000)
+    parser.add_argument("--storage", choices=["float32", "float16", "int8"], default="float32")
+    parser.add_argument("--connect-delay", type=float, default=0.05, help="模拟的新连接握手延迟（秒）")
+    parser.add_argument("--models-delay", type=float, default=0.05, help="模拟上游 GET /models 的处理延迟（秒）")
+    parser.add_argument("--first-token-delay", type=float, default=0.05, help="模拟上游首token延迟（秒）")
+    parser.add_argument("--keepalive", type=float, default=0.2, help="后端到上游连接的保活时间（秒）")
+    parser.add_argument("--idle", type=float, default=0.3, help="相邻请求的间隔（秒）")
+    parser.add_argument("--think-time", type=float, default=0.1, help="预取与聊天请求之间的间隔（秒）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="结果JSON输出路径，默认标准输出")
+    args = parser.parse_args(argv)
+
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    upstream_server = ServerProcess(
+        ["benchmarks.mock_upstream", "--port", "{port}", "--first-token-delay", str(args.first_token_delay),
+         "--connect-delay", str(args.connect_delay), "--models-delay", str(args.models_delay)],
+        ready_path="/stats"
+    )
+    with tempfile.TemporaryDirectory() as workdir, upstream_server, \
+            httpx.Client(base_url=upstream_server.base_url) as upstream:
+        corpus = generate_corpus(os.path.join(workdir, "corpus"), args.documents, args.chars, seed=args.seed)
+        queries = sample_queries(corpus, args.requests)
+        results = {}
+        for mode, warmup, prefetch in (("serial", False, False), ("warmup", True, False),
+                                       ("prefetch", True, True)):
+            results[mode] = run_app(args, workdir, upstream_server.base_url, upstream, corpus, queries,
+                                    mode, warmup, prefetch)
+
+    dump({"benchmark": "ttft", "parameters": vars(args), "modes": results}, args.output)
+
+if __name__ == "__main__":
+    main()